@@ -0,0 +1,360 @@
+"""asyncio serving mode: streaming endpoints on coroutines, everything else through the Flask app.
+
+``/stream/mjpeg`` viewers and ``/emulate[/<id>]/stream`` SSE clients are
+served by coroutines on one event loop, so an idle connection costs a socket
+and a few kilobytes instead of a thread. Frame hubs and SSE broadcasters wake
+the loop through listener callbacks (one cross-thread call per frame or event,
+however many clients are waiting), and a client hanging up is noticed even
+while nothing is being sent. Work that blocks -- waiting for a camera's first
+frame, re-encoding stream variants and every other route, which runs through
+Flask's WSGI app -- goes to a bounded thread pool of ``workers``. WSGI
+responses are buffered whole and sent with a Content-Length, so only the two
+routes above stream. Camera reads stay on the hubs' producer threads, one per
+open source.
+
+Run with ``SERVER_MODE=async python app.py`` or ``python async_server.py``.
+Routes and payloads are the same as in the threaded server.
+"""
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote_to_bytes
+
+import metrics
+from sse import DISCONNECTED, HEARTBEAT, SSE_BYTES_SENT, sse_frame
+
+_SSE_ROUTE = re.compile(r"^/emulate/(?:([^/]+)/)?stream$")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 411: "Length Required", 500: "Internal Server Error"}
+_CORS = (
+    ("Access-Control-Allow-Origin", "*"),
+    ("Access-Control-Allow-Methods", "GET,POST,DELETE,OPTIONS"),
+    ("Access-Control-Allow-Headers", "Content-Type,Authorization"),
+)
+
+
+class LoopSignal:
+    """Wakes coroutines on the event loop when another thread calls ``notify_threadsafe``.
+
+    Waiters check their condition and create their future without yielding in
+    between, and the wake-up runs on the loop, so no notification is lost.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._waiters = set()
+
+    def notify_threadsafe(self):
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        for future in self._waiters:
+            if not future.done():
+                future.set_result(None)
+        self._waiters.clear()
+
+    async def wait(self, timeout, closed=None):
+        """Wait for a notification, ``timeout`` seconds, or ``closed`` (the client hanging up) to finish."""
+        future = self.loop.create_future()
+        self._waiters.add(future)
+        try:
+            await asyncio.wait([future] if closed is None else [future, closed], timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._waiters.discard(future)
+
+
+class _BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_body(payload):
+    # Same encoding as Flask's JSON provider (compact, sorted keys, trailing newline)
+    return (json.dumps(payload, separators=(",", ":"), sort_keys=True) + "\n").encode()
+
+
+class AsyncStreamingServer:
+    def __init__(self, module, host="0.0.0.0", port=5001, workers=16, max_header_bytes=64 * 1024):
+        self.m = module
+        self.host = host
+        self.port = port
+        self.max_header_bytes = max_header_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-io")
+        self.workers = workers
+        self.loop = None
+        self._signals = {}  # FrameHub or SSEBroadcaster -> [LoopSignal, streams using it]
+        self.connections = 0
+        self.streams = {"mjpeg": 0, "sse": 0}
+        metrics.gauge("async_open_connections", "Open connections on the asyncio server", lambda: self.connections)
+        metrics.gauge("async_open_streams", "Open streaming responses on the asyncio server",
+                      lambda: {(kind,): n for kind, n in self.streams.items()}, ("kind",))
+
+    def _acquire_signal(self, source):
+        """The loop signal of a FrameHub or SSEBroadcaster, registering its listener on first use."""
+        entry = self._signals.get(source)
+        if entry is None:
+            entry = self._signals[source] = [LoopSignal(self.loop), 0]
+            source.add_listener(entry[0].notify_threadsafe)
+        entry[1] += 1
+        return entry[0]
+
+    def _release_signal(self, source):
+        """Drop one stream's use of a signal; the listener is removed with the last one."""
+        entry = self._signals[source]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._signals[source]
+            source.remove_listener(entry[0].notify_threadsafe)
+
+    async def _read_request(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise _BadRequest(411, "Chunked request bodies are not supported")
+        length = int(headers.get("content-length") or 0)
+        if length and headers.get("expect", "").lower() == "100-continue":
+            # Clients such as curl hold the body back until told to send it
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version, headers, body
+
+    async def _write_head(self, writer, status, headers):
+        reason = _REASONS.get(status, "")
+        lines = [f"HTTP/1.1 {status} {reason}"] + [f"{name}: {value}" for name, value in headers]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _write_json(self, writer, status, payload):
+        body = _json_body(payload)
+        await self._write_head(writer, status, (("Content-Type", "application/json"),
+                                                ("Content-Length", str(len(body))), ("Connection", "close")) + _CORS)
+        writer.write(body)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    method, target, version, headers, body = await self._read_request(reader, writer)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+                    return
+                except _BadRequest as e:
+                    await self._write_json(writer, e.status, {"error": str(e)})
+                    return
+                path, _, query = target.partition("?")
+                args = {k: v[0] for k, v in parse_qs(query, keep_blank_values=True).items()}
+                sse = _SSE_ROUTE.match(path)
+                if method == "GET" and path == "/stream/mjpeg":
+                    await self._mjpeg(reader, writer, args)
+                    return
+                if method == "GET" and sse:
+                    await self._sse(reader, writer, sse.group(1) or self.m.DEFAULT_EMULATION_SESSION, headers, args)
+                    return
+                keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close")
+                await self._wsgi(writer, method, path, query, version, headers, body, keep_alive)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _environ(self, method, path, query, version, headers, body, peer):
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote_to_bytes(path).decode("latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": peer[0] if peer else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace("-", "_")
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[key] = value
+            else:
+                environ[f"HTTP_{key}"] = value
+        return environ
+
+    def _call_wsgi(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"], response["headers"] = status, headers
+
+        result = self.m.app(environ, start_response)
+        try:
+            body = b"".join(result)
+        finally:
+            close = getattr(result, "close", None)
+            if close:
+                close()
+        return response["status"], response["headers"], body
+
+    async def _wsgi(self, writer, method, path, query, version, headers, body, keep_alive):
+        environ = self._environ(method, path, query, version, headers, body, writer.get_extra_info("peername"))
+        status, response_headers, payload = await self.loop.run_in_executor(self.executor, self._call_wsgi, environ)
+        response_headers = [(k, v) for k, v in response_headers if k.lower() not in ("content-length", "connection")]
+        response_headers += [("Content-Length", str(len(payload))),
+                             ("Connection", "keep-alive" if keep_alive else "close")]
+        code, _, reason = status.partition(" ")
+        lines = [f"HTTP/1.1 {code} {reason}"] + [f"{k}: {v}" for k, v in response_headers]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (payload if method != "HEAD" else b""))
+        await writer.drain()
+
+    async def _mjpeg(self, reader, writer, args):
+        m = self.m
+        try:
+            source, hub, framed, fps, variant = m.open_mjpeg_stream(args)
+        except ValueError as e:
+            await self._write_json(writer, 400, {"error": str(e)})
+            return
+        if not await self.loop.run_in_executor(self.executor, hub.wait_for_frame, 10):
+            await self._write_json(writer, 500, {"error": hub.error or f"No frames from video source: {source}"})
+            return
+        await self._write_head(writer, 200, (
+            ("Content-Type", f"multipart/x-mixed-replace; boundary={m.BOUNDARY}"),
+            ("Connection", "close")) + _CORS)
+        signal = self._acquire_signal(hub)
+        # A streaming client sends nothing more; EOF (or anything else) means it has gone
+        closed = self.loop.create_task(reader.read(1))
+        frames_sent = m.FRAMES_STREAMED.labels(hub.source)
+        bytes_sent = m.STREAM_BYTES_SENT.labels(hub.source)
+        interval = 1.0 / fps if fps else 0.0
+        due = self.loop.time()
+        last_seq = 0
+        hub.attach()
+        self.streams["mjpeg"] += 1
+        try:
+            while True:
+                if interval:
+                    delay = due - self.loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                item = hub.frame_after(last_seq)
+                if item is None:
+                    if not hub.running:
+                        return
+                    await signal.wait(10.0, closed)
+                    if closed.done():
+                        return
+                    continue
+                last_seq, jpeg, decoded = item
+                if variant is not None:
+                    jpeg = await self.loop.run_in_executor(self.executor, variant.encode, last_seq, jpeg, decoded)
+                part = jpeg if framed else m.mjpeg_part(jpeg)
+                writer.write(part)
+                # A slow viewer waits here while newer frames replace older ones in the hub
+                await writer.drain()
+                frames_sent.inc()
+                bytes_sent.inc(len(part))
+                if interval:
+                    due += interval
+                    now = self.loop.time()
+                    if due < now - interval:
+                        due = now
+        finally:
+            self.streams["mjpeg"] -= 1
+            closed.cancel()
+            self._release_signal(hub)
+            hub.detach()
+
+    async def _sse(self, reader, writer, session_id, headers, args):
+        m = self.m
+        # The default session accepts subscribers before it is started, as the dashboard expects
+        session = m.get_emulation_session(session_id, create=session_id == m.DEFAULT_EMULATION_SESSION)
+        if session is None:
+            await self._write_json(writer, 404, {"error": f"Unknown emulation session: {session_id}"})
+            return
+        last_event_id = headers.get("last-event-id") or args.get("lastEventId")
+        await self._write_head(writer, 200, (
+            ("Content-Type", "text/event-stream; charset=utf-8"),
+            ("Cache-Control", "no-cache"),
+            ("X-Accel-Buffering", "no"),
+            ("Connection", "close")) + _CORS)
+        broadcaster = session.broadcaster
+        signal = self._acquire_signal(broadcaster)
+        closed = self.loop.create_task(reader.read(1))
+        cursor = broadcaster.attach(last_event_id)
+        self.streams["sse"] += 1
+        try:
+            chunk = sse_frame(session.status_event())
+            while True:
+                writer.write(chunk)
+                await writer.drain()
+                SSE_BYTES_SENT.inc(len(chunk))
+                chunk, cursor = broadcaster.take(cursor)
+                if chunk is None:
+                    await signal.wait(broadcaster.heartbeat_seconds, closed)
+                    if closed.done():
+                        return
+                    chunk, cursor = broadcaster.take(cursor)
+                if chunk is DISCONNECTED:
+                    return
+                if chunk is None:
+                    chunk = HEARTBEAT
+        finally:
+            self.streams["sse"] -= 1
+            closed.cancel()
+            self._release_signal(broadcaster)
+            broadcaster.detach()
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self.handle, self.host, self.port, limit=self.max_header_bytes,
+                                            backlog=2048)
+        print(f"asyncio server on http://{self.host}:{self.port} ({self.workers} blocking-I/O workers)")
+        async with server:
+            await server.serve_forever()
+
+    def serve_forever(self):
+        asyncio.run(self._main())
+
+
+def _raise_fd_limit():
+    """Every client holds a socket; lift the soft open-files limit to the hard one."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+def serve(module, host="0.0.0.0", port=5001, workers=None):
+    """Serve ``module`` (the imported ``app`` module) in asyncio mode until interrupted."""
+    workers = workers or int(os.environ.get("ASYNC_IO_WORKERS", "16"))
+    limit = _raise_fd_limit()
+    if limit:
+        print(f"Open file limit: {limit}")
+    AsyncStreamingServer(module, host, port, workers=workers).serve_forever()
+
+
+if __name__ == "__main__":
+    import app
+
+    serve(app, port=int(os.environ.get("PORT", 5001)))
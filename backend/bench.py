@@ -0,0 +1,436 @@
+"""Offline benchmarks for the hot paths, run against local stand-in servers.
+
+Starts a fake MJPEG camera, Gemini API, SMS gateway and Next.js ingest
+endpoint on free local ports, points the app at them through its env vars and
+measures throughput, p50/p99 latency and peak traced memory of each path::
+
+    python bench.py                              # all benchmarks, printed as a table
+    python bench.py --only sse_fanout sms        # a subset
+    python bench.py --save baselines/main.json   # keep the results as a baseline
+    python bench.py --compare baselines/main.json --tolerance 0.15
+
+``--compare`` exits with status 1 when a benchmark's throughput dropped or its
+p99 latency rose by more than the tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+import cv2
+import numpy as np
+
+from delivery import run_fake_ingest
+from fake_gemini import run_fake_gemini
+from fake_mjpeg import run_fake_mjpeg, synthetic_frames
+from sms_outbox import run_fake_gateway
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class BenchContext:
+    """Fake servers plus the app module configured to use them (imported once, after the env is set)."""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.mkdtemp(prefix="phyto-bench-")
+        self.frames = synthetic_frames(args.width, args.height, count=30)
+        self.mjpeg = run_fake_mjpeg(port=0, fps=0, frames=self.frames)
+        self.gemini = run_fake_gemini(port=0, latency=args.gemini_latency, jitter=args.gemini_jitter)
+        self.gateway = run_fake_gateway(port=0, latency=args.sms_latency)
+        self.ingest = run_fake_ingest(port=0, latency=args.ingest_latency)
+        self.mjpeg_url = _serve(self.mjpeg) + "/video"
+        os.environ.update({
+            "GEMINI_API_ENDPOINT": _serve(self.gemini),
+            "GEMINI_RPM": "1000000",
+            "GEMINI_HEDGING": "0",
+            "SMS_GATEWAY_URL": _serve(self.gateway),
+            "NEXTJS_INGEST_URL": _serve(self.ingest) + "/api/phytoplankton",
+            "NEXTJS_SPOOL_PATH": os.path.join(self.tmp, "nextjs.jsonl"),
+            "HISTORY": "0",
+            "RESULT_CACHE": "0",
+            "FPS": str(args.cv_fps),
+        })
+        with quiet():
+            import app
+        self.app = app
+
+    def video_file(self, frames):
+        """At least ``frames`` synthetic frames written to an MJPG AVI, so the OpenCV capture path can open it."""
+        loops = -(-frames // len(self.frames))
+        path = os.path.join(self.tmp, f"source-{loops}.avi")
+        if not os.path.exists(path):
+            images = [cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR) for jpeg in self.frames]
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (self.args.width, self.args.height))
+            for _ in range(loops):
+                for image in images:
+                    writer.write(image)
+            writer.release()
+        return path
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the app's per-event prints so they don't dominate the timings."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _timed_iter(gen, n):
+    """Latency of each of the first ``n`` items of ``gen`` (time since the previous one)."""
+    latencies = []
+    last = time.perf_counter()
+    for _ in range(n):
+        next(gen)
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+    gen.close()
+    return latencies
+
+
+@benchmark("emulation_record")
+def bench_emulation_record(ctx, n):
+    """``process_emulation_record`` over the bundled emulation dataset."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "emulation.json")) as f:
+        records = json.load(f)
+    process = ctx.app.process_emulation_record
+    latencies = []
+    for i in range(n):
+        started = time.perf_counter()
+        process(records[i % len(records)])
+        latencies.append(time.perf_counter() - started)
+    return latencies, {}
+
+
+def _reference_ticks(window, baseline_window, multiplier):
+    """The per-record defaultdict/deque logic RollingThresholdEngine replaced, kept as the speedup reference."""
+    windows = defaultdict(lambda: deque(maxlen=window))
+    baselines = defaultdict(list)
+    above_start = defaultdict(lambda: None)
+
+    def process(rec, now):
+        species = rec.get('phytoplanktonscientificName') or 'Unknown'
+        try:
+            raw = float(str(rec.get('no of that pyhtoplankon') or rec.get('count') or '0').replace(',', '').strip())
+        except ValueError:
+            raw = 0.0
+        win = windows[species]
+        win.append(raw)
+        moving_avg = sum(win) / len(win)
+        if len(baselines[species]) < baseline_window:
+            baselines[species].append(raw)
+        baseline = threshold = None
+        if len(baselines[species]) == baseline_window:
+            baseline = sum(baselines[species]) / baseline_window
+            threshold = baseline * multiplier
+        breach = threshold is not None and moving_avg >= threshold
+        if breach and above_start[species] is None:
+            above_start[species] = now
+        elif threshold is not None and not breach:
+            above_start[species] = None
+        return {"type": "emulation_tick", "timestamp": rec.get('timestamp'), "species": species, "raw": raw,
+                "movingAvg": moving_avg, "baseline": baseline, "threshold": threshold, "breach": breach}
+    return process
+
+@benchmark("emulation_batch")
+def bench_emulation_batch(ctx, n):
+    """``RollingThresholdEngine.process_batch`` on timestamps of ``--batch-species`` species each.
+
+    ``referenceMs`` and ``speedup`` compare it with the per-record defaultdict logic it replaced.
+    """
+    app = ctx.app
+    species = ctx.args.batch_species
+    rng = np.random.default_rng(0)
+    batches = [[{"timestamp": f"t{i}", "phytoplanktonscientificName": f"Species {s}",
+                 "no of that pyhtoplankon": f"{int(c):,}"} for s, c in enumerate(rng.integers(0, 5000, species))]
+               for i in range(min(n, 20))]
+    engine = app.new_emulation_engine()
+    engine.on_alert = None
+    latencies = []
+    for i in range(n):
+        started = time.perf_counter()
+        engine.process_batch(batches[i % len(batches)], now=float(i))
+        latencies.append(time.perf_counter() - started)
+    reference = _reference_ticks(app.MOVING_AVG_WINDOW, app.BASELINE_WINDOW, app.THRESHOLD_MULTIPLIER)
+    reference_seconds = []
+    for i in range(n):
+        started = time.perf_counter()
+        for rec in batches[i % len(batches)]:
+            reference(rec, float(i))
+        reference_seconds.append(time.perf_counter() - started)
+    reference_ms = float(np.median(reference_seconds)) * 1000
+    return latencies, {"speciesPerBatch": species, "referenceMs": round(reference_ms, 4),
+                       "speedup": round(reference_ms / (float(np.median(latencies)) * 1000), 2)}
+
+@benchmark("mjpeg_http")
+def bench_mjpeg_http(ctx, n):
+    """``mjpeg_generator_from_http`` proxying the fake camera, which sends as fast as it's read."""
+    gen = ctx.app.mjpeg_generator_from_http(ctx.mjpeg_url)
+    return _timed_iter(gen, n), {"frameBytes": int(np.mean([len(f) for f in ctx.frames]))}
+
+
+@benchmark("mjpeg_cv")
+def bench_mjpeg_cv(ctx, n):
+    """``mjpeg_generator_from_cv`` reading a video file: decode, JPEG encode and the per-frame pacing sleep."""
+    return _timed_iter(ctx.app.mjpeg_generator_from_cv(ctx.video_file(n + 1)), n), {"fps": ctx.args.cv_fps}
+
+
+@benchmark("cv_encode")
+def bench_cv_encode(ctx, n):
+    """``cv2.imencode`` alone at default quality, full resolution (the per-frame cost in ``mjpeg_generator_from_cv``)."""
+    images = [cv2.imdecode(np.frombuffer(f, np.uint8), cv2.IMREAD_COLOR) for f in ctx.frames[:5]]
+    latencies = []
+    for i in range(n):
+        started = time.perf_counter()
+        cv2.imencode(".jpg", images[i % len(images)])
+        latencies.append(time.perf_counter() - started)
+    return latencies, {"width": ctx.args.width, "height": ctx.args.height}
+
+
+@benchmark("sse_fanout")
+def bench_sse_fanout(ctx, n):
+    """Emulation-tick SSE broadcast to ``--sse-clients`` clients; latency is publish until every client has it.
+
+    Each tick is published once the previous one has reached every client, as in a live emulation.
+    """
+    app = ctx.app
+    broadcaster = app.SSEBroadcaster(history=app.SSE_REPLAY_EVENTS, client_buffer=app.SSE_CLIENT_BUFFER,
+                                     policy=app.SSE_SLOW_CLIENT_POLICY, heartbeat_seconds=1.0)
+    clients = ctx.args.sse_clients
+    received = np.zeros((clients, n + 1))
+    id_pattern = re.compile(rb"^id: (\d+)$", re.M)
+
+    def client(c):
+        stream = broadcaster.stream()
+        for chunk in stream:
+            now = time.perf_counter()
+            ids = [int(m) for m in id_pattern.findall(chunk)]
+            for event_id in ids:
+                received[c, event_id] = now
+            if ids and ids[-1] >= n:
+                stream.close()
+                return
+
+    threads = [threading.Thread(target=client, args=(c,), daemon=True) for c in range(clients)]
+    for t in threads:
+        t.start()
+    # stream() registers the client on its first next(); wait until every client is attached
+    while broadcaster.status()["clients"] < clients:
+        time.sleep(0.001)
+    records = [{"phytoplanktonscientificName": "Diatoms", "no of that pyhtoplankon": str(i % 50)} for i in range(n)]
+    published = np.zeros(n + 1)
+    for i, rec in enumerate(records, start=1):
+        payload = {"type": "emulation_tick", "timestamp": i, "data": [app.process_emulation_record(rec)]}
+        published[i] = time.perf_counter()
+        broadcaster.publish(payload)
+        # Ticks are seconds apart in practice; a back-to-back burst would only measure the slow-client policy
+        deadline = time.time() + 1.0
+        while not received[:, i].all() and time.time() < deadline:
+            time.sleep(0.0001)
+    for t in threads:
+        t.join(30)
+    delivered = received[:, 1:] > 0
+    latest = np.where(delivered, received[:, 1:], np.nan).max(axis=0)
+    latencies = (latest - published[1:])[~np.isnan(latest)]
+    return latencies.tolist(), {"clients": clients, "deliveries": int(delivered.sum()),
+                                "dropped": broadcaster.status()["dropped"]}
+
+
+@benchmark("sms")
+def bench_sms(ctx, n):
+    """``send_sms_alert`` through the outbox to the fake gateway; latency is enqueue until every recipient is sent."""
+    outbox = ctx.app.sms_outbox
+    created = {}
+    for i in range(n):
+        started = time.perf_counter()
+        ctx.app.send_sms_alert([{"phytoplanktonscientificName": f"Species {i}"}])
+        created[outbox.status(recent=1)["recentAlerts"][-1]["id"]] = started
+    latencies = {}
+    deadline = time.time() + 60
+    while len(latencies) < len(created) and time.time() < deadline:
+        now = time.perf_counter()
+        for alert_id, started in created.items():
+            if alert_id in latencies:
+                continue
+            alert = outbox.alert_status(alert_id)
+            if alert is None or all(r["status"] in ("sent", "failed", "rejected")
+                                    for r in alert["recipients"].values()):
+                latencies[alert_id] = now - started
+        time.sleep(0.002)
+    return list(latencies.values()), {"recipients": len(outbox.numbers), "gatewayLatencyMs": ctx.args.sms_latency * 1000}
+
+
+@benchmark("gemini_infer")
+def bench_gemini_infer(ctx, n):
+    """``infer_frame`` (preprocess, pooled/deadlined Gemini call, JSON parse) against the fake Gemini."""
+    app = ctx.app
+    latencies = []
+    for i in range(n):
+        frame = app.CapturedFrame(ctx.frames[i % len(ctx.frames)], source="bench")
+        started = time.perf_counter()
+        app.infer_frame(frame)
+        latencies.append(time.perf_counter() - started)
+    return latencies, {"geminiLatencyMs": ctx.args.gemini_latency * 1000}
+
+
+@benchmark("nextjs_post")
+def bench_nextjs_post(ctx, n):
+    """``DeliveryClient.post`` of one analysis result to the fake Next.js ingest endpoint."""
+    payload = json.loads(json.dumps([{"phytoplanktonscientificName": "Diatoms", "Confidence": "85"}] * 3))
+    client = ctx.app.nextjs_client
+    latencies = []
+    for _ in range(n):
+        started = time.perf_counter()
+        client.post(payload)
+        latencies.append(time.perf_counter() - started)
+    return latencies, {"ingestLatencyMs": ctx.args.ingest_latency * 1000}
+
+
+DEFAULT_OPS = {
+    "emulation_record": 20000,
+    "emulation_batch": 100,
+    "mjpeg_http": 300,
+    "mjpeg_cv": 200,
+    "cv_encode": 200,
+    "sse_fanout": 500,
+    "sms": 50,
+    "gemini_infer": 50,
+    "nextjs_post": 200,
+}
+
+
+def run_one(ctx, name, n, memory=True):
+    fn = BENCHMARKS[name]
+    with quiet():
+        started = time.perf_counter()
+        latencies, extra = fn(ctx, n)
+        seconds = time.perf_counter() - started
+        peak = None
+        if memory:
+            # Separate pass: tracing allocations slows the timed one down too much
+            tracemalloc.start()
+            fn(ctx, n)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    lat = np.asarray(latencies, dtype=np.float64) * 1000
+    return dict({
+        "ops": len(latencies),
+        "seconds": round(seconds, 4),
+        "throughputPerSec": round(len(latencies) / seconds, 2) if seconds else None,
+        "p50Ms": round(float(np.percentile(lat, 50)), 4) if lat.size else None,
+        "p99Ms": round(float(np.percentile(lat, 99)), 4) if lat.size else None,
+        "meanMs": round(float(lat.mean()), 4) if lat.size else None,
+        "maxMs": round(float(lat.max()), 4) if lat.size else None,
+        "peakMemoryBytes": peak,
+    }, **extra)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline`` (both ``{"results": {name: metrics}}``)."""
+    regressions = []
+    for name, current in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        if base.get("throughputPerSec") and current.get("throughputPerSec") is not None and \
+                current["throughputPerSec"] < base["throughputPerSec"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughputPerSec']:g}/s "
+                               f"vs {base['throughputPerSec']:g}/s baseline")
+        if base.get("p99Ms") and current.get("p99Ms") is not None and \
+                current["p99Ms"] > base["p99Ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {current['p99Ms']:g} ms vs {base['p99Ms']:g} ms baseline")
+    return regressions
+
+
+def print_table(results, baseline=None):
+    header = f"{'benchmark':<18}{'ops':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak MiB':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results["results"].items():
+        peak = f"{r['peakMemoryBytes'] / 2 ** 20:.2f}" if r["peakMemoryBytes"] is not None else "-"
+        line = f"{name:<18}{r['ops']:>8}{r['throughputPerSec'] or 0:>12.1f}{r['p50Ms'] or 0:>10.3f}" \
+               f"{r['p99Ms'] or 0:>10.3f}{peak:>10}"
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and base.get("throughputPerSec") and r["throughputPerSec"]:
+            line += f"   ({r['throughputPerSec'] / base['throughputPerSec'] - 1:+.1%} ops/s vs baseline)"
+        if r.get("speedup"):
+            line += f"   ({r['speedup']:g}x vs reference)"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against local stand-in servers")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every benchmark's op count")
+    parser.add_argument("--no-memory", action="store_true", help="skip the allocation-tracing pass")
+    parser.add_argument("--save", help="write the results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--cv-fps", type=float, default=60.0, help="FPS setting for the OpenCV stream path")
+    parser.add_argument("--sse-clients", type=int, default=50)
+    parser.add_argument("--batch-species", type=int, default=5000, help="species per emulation_batch timestamp")
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-jitter", type=float, default=0.0)
+    parser.add_argument("--sms-latency", type=float, default=0.005)
+    parser.add_argument("--ingest-latency", type=float, default=0.002)
+    args = parser.parse_args(argv)
+
+    ctx = BenchContext(args)
+    names = args.only or list(BENCHMARKS)
+    results = {
+        "createdAt": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "opencv": cv2.__version__,
+        "config": {k: v for k, v in vars(args).items() if k not in ("only", "save", "compare")},
+        "results": {},
+    }
+    for name in names:
+        n = max(1, int(DEFAULT_OPS[name] * args.scale))
+        print(f"Running {name} ({n} ops)...", file=sys.stderr)
+        results["results"][name] = run_one(ctx, name, n, memory=not args.no_memory)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+ELEVATED_LEVELS = ("mid", "high")
+# Frames are compared on a tiny grayscale thumbnail; a pixel "changed" past this many grey levels
+_THUMB_SIZE = (64, 48)
+_PIXEL_DELTA = 12
+
+
+def thumbnail(frame):
+    """Small grayscale thumbnail of a CapturedFrame for change detection, or None if undecodable."""
+    if frame.decoded is not None:
+        gray = frame.decoded
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = cv2.imdecode(np.frombuffer(frame.data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            return None
+    return cv2.resize(gray, _THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def _signature(species_list):
+    return frozenset(
+        ((sp.get("phytoplanktonscientificName") or "Unknown"), str(sp.get("alertLevel", "")).lower())
+        for sp in species_list or [] if isinstance(sp, dict))
+
+
+class AdaptiveScheduler:
+    """Decides how long auto-capture waits before the next frame.
+
+    Sampling runs at ``min_interval`` while the latest result has a Mid/High
+    species or the scene is changing (the fraction of changed pixels between
+    consecutive captures is at least ``change_threshold``). Otherwise it runs at
+    ``base_interval``, and once ``stable_results`` results in a row show the
+    same species and alert levels the interval grows by ``backoff`` per further
+    stable result, up to ``max_interval``.
+
+    Every remote inference is recorded against ``budget_per_hour`` (0 means no
+    budget) over a sliding hour: past half the budget, sampling is paced so the
+    remainder lasts, and when it is spent capture waits until the oldest call
+    leaves the window.
+    """
+
+    def __init__(self, base_interval=15.0, min_interval=5.0, max_interval=120.0, backoff=1.5,
+                 stable_results=3, change_threshold=0.05, budget_per_hour=0, adaptive=True):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.backoff = backoff
+        self.stable_results = stable_results
+        self.change_threshold = change_threshold
+        self.budget_per_hour = budget_per_hour
+        self.adaptive = adaptive
+        self._cond = threading.Condition()
+        self._calls = deque()
+        self._thumb = None
+        self._signature = None
+        self.stable = 0
+        self.elevated = False
+        self.change = None
+        self.effective_interval = base_interval
+        self.reason = "base"
+        self.waits = {}
+
+    def observe_frame(self, frame):
+        """Measure how much the scene changed since the previous capture. Returns the changed fraction."""
+        thumb = thumbnail(frame)
+        with self._cond:
+            previous, self._thumb = self._thumb, thumb
+            if thumb is None or previous is None:
+                return None
+            self.change = float(np.count_nonzero(cv2.absdiff(thumb, previous) > _PIXEL_DELTA)) / thumb.size
+            return self.change
+
+    def observe_result(self, species_list):
+        """Fold in an analysis result (an empty list for frames with nothing to analyze)."""
+        signature = _signature(species_list)
+        elevated = any(level in ELEVATED_LEVELS for _, level in signature)
+        with self._cond:
+            self.stable = self.stable + 1 if signature == self._signature else 0
+            self._signature = signature
+            was_elevated, self.elevated = self.elevated, elevated
+            if elevated and not was_elevated:
+                # Shorten a long wait that is already under way
+                self._cond.notify_all()
+
+    def record_inference(self, count=1):
+        now = time.time()
+        with self._cond:
+            self._calls.extend([now] * count)
+            self._trim(now)
+
+    def try_record_inference(self):
+        """Record one inference if the budget allows it; returns False (recording nothing) once it is spent."""
+        now = time.time()
+        with self._cond:
+            self._trim(now)
+            if self.budget_per_hour and len(self._calls) >= self.budget_per_hour:
+                return False
+            self._calls.append(now)
+            return True
+
+    def budget_exhausted(self):
+        """Whether the hourly inference budget is spent (never with no budget)."""
+        if not self.budget_per_hour:
+            return False
+        now = time.time()
+        with self._cond:
+            self._trim(now)
+            return len(self._calls) >= self.budget_per_hour
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0] >= 3600:
+            self._calls.popleft()
+
+    def _desired(self):
+        if not self.adaptive:
+            return self.base_interval, "fixed"
+        if self.elevated:
+            return self.min_interval, "elevated alert"
+        if self.change is not None and self.change >= self.change_threshold:
+            return self.min_interval, "scene changing"
+        extra = self.stable - self.stable_results + 1
+        if extra > 0:
+            return min(self.max_interval, self.base_interval * self.backoff ** extra), "stable"
+        return self.base_interval, "base"
+
+    def next_interval(self, now=None):
+        """``(seconds, reason)`` to wait after a capture taken at ``now``."""
+        now = time.time() if now is None else now
+        with self._cond:
+            return self._next_interval_locked(now)
+
+    def _next_interval_locked(self, now):
+        interval, reason = self._desired()
+        if self.budget_per_hour:
+            self._trim(now)
+            used = len(self._calls)
+            if used >= self.budget_per_hour:
+                interval, reason = max(interval, self._calls[0] + 3600 - now), "budget exhausted"
+            elif used >= self.budget_per_hour / 2 and 3600 / self.budget_per_hour > interval:
+                interval, reason = 3600 / self.budget_per_hour, "budget pacing"
+        self.effective_interval, self.reason = interval, reason
+        return interval, reason
+
+    def wait(self, last_capture, should_run):
+        """Sleep until the next capture is due, re-planning when an alert or ``wake`` arrives."""
+        while should_run():
+            with self._cond:
+                interval, reason = self._next_interval_locked(time.time())
+                delay = last_capture + interval - time.time()
+                if delay <= 0:
+                    self.waits[reason] = self.waits.get(reason, 0) + 1
+                    return
+                self._cond.wait(delay)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def status(self):
+        now = time.time()
+        with self._cond:
+            self._trim(now)
+            used = len(self._calls)
+            return {
+                "adaptive": self.adaptive,
+                "effectiveIntervalSeconds": self.effective_interval,
+                "reason": self.reason,
+                "baseIntervalSeconds": self.base_interval,
+                "minIntervalSeconds": self.min_interval,
+                "maxIntervalSeconds": self.max_interval,
+                "elevatedAlert": self.elevated,
+                "sceneChange": self.change,
+                "changeThreshold": self.change_threshold,
+                "stableResults": self.stable,
+                "budgetPerHour": self.budget_per_hour or None,
+                "inferencesLastHour": used,
+                "budgetRemaining": max(0, self.budget_per_hour - used) if self.budget_per_hour else None,
+                "capturesByReason": dict(self.waits),
+            }
@@ -0,0 +1,356 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+NEXTJS_POST_SECONDS = metrics.histogram("nextjs_delivery_seconds", "Next.js ingest POST latency", ("outcome",))
+
+
+class ResultSpool:
+    """Append-only JSON-lines file of undelivered batches, replayed in order.
+
+    Delivery progress is a byte offset kept in ``<path>.offset``; once every
+    spooled batch has been delivered both files are truncated, which is the
+    only time the spool shrinks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._drop_torn_tail()
+        self.offset = self._read_offset()
+        self.pending = self._count_pending()
+
+    def _drop_torn_tail(self):
+        """Cut off a final line left half-written by a crash so appends stay line-aligned."""
+        try:
+            with open(self.path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+                    print(f"Dropped torn entry at the end of {self.path}")
+        except OSError:
+            pass
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, "r") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _count_pending(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                return sum(1 for line in f if line.strip())
+        except OSError:
+            return 0
+
+    def append(self, payload):
+        line = json.dumps({"spooledAt": time.time(), "payload": payload}, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending += 1
+
+    def peek(self):
+        """Oldest undelivered batch as ``(payload, next_offset)``, or None when the spool is drained."""
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self.offset)
+                    while True:
+                        line = f.readline()
+                        if not line:
+                            self._compact_locked()
+                            return None
+                        if line.strip():
+                            try:
+                                return json.loads(line)["payload"], f.tell()
+                            except (ValueError, KeyError):
+                                print(f"Skipping corrupt spool entry at offset {self.offset}")
+                                self.pending = max(0, self.pending - 1)
+                        self.offset = f.tell()
+            except OSError:
+                return None
+
+    def commit(self, next_offset):
+        """Mark everything before ``next_offset`` as delivered."""
+        with self._lock:
+            self.offset = next_offset
+            self.pending = max(0, self.pending - 1)
+            if self.pending == 0:
+                self._compact_locked()
+            else:
+                self._write_offset_locked()
+
+    def _compact_locked(self):
+        # Fully drained: compact by truncating instead of rewriting
+        open(self.path, "w").close()
+        self.offset = 0
+        self.pending = 0
+        self._write_offset_locked()
+
+    def _write_offset_locked(self):
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(self.offset))
+        os.replace(tmp, self.offset_path)
+
+
+class DeliveryClient:
+    """Coalescing, spooling client for the Next.js ingest endpoint.
+
+    ``submit`` never blocks: results that arrive within ``window`` seconds of
+    each other are coalesced into one POST over a keep-alive session. The
+    ingest route replaces the dashboard's snapshot with each POST, so only the
+    newest result of the window is sent; concatenating several frames' species
+    lists would show them as one analysis with duplicate rows. A batch that
+    can't be delivered is appended to a ``ResultSpool`` and every
+    later batch queues behind it, so the endpoint sees results in order once
+    it comes back; the spool is retried every ``retry_interval`` seconds.
+
+    Only connection errors, 5xx and 429 are retried. Any other non-200 answer
+    (e.g. a 400 for a malformed payload) would fail the same way forever, so
+    that batch is appended to the dead-letter file ``<spool_path>.rejected``
+    and delivery moves on.
+    """
+
+    def __init__(self, url, spool_path, window=0.5, max_batch=50, timeout=10.0, retry_interval=5.0):
+        self.url = url
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.spool = ResultSpool(spool_path)
+        self.rejected_path = f"{spool_path}.rejected"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._first_at = None
+        self._thread = None
+        self._send_lock = threading.Lock()
+        self.results = 0
+        self.batches = 0
+        self.superseded = 0
+        self.delivered = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_delivered_at = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="nextjs-delivery", daemon=True)
+            self._thread.start()
+
+    def submit(self, species_list):
+        """Queue one analysis result (a list of species) for coalesced delivery."""
+        self.start()
+        with self._cond:
+            if not self._buffer:
+                self._first_at = time.time()
+            self._buffer.append(species_list)
+            self.results += 1
+            self._cond.notify_all()
+
+    def _post(self, payload):
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            NEXTJS_POST_SECONDS.labels("failed").observe(time.perf_counter() - started)
+            self.last_error = str(e)
+            return False, None
+        ok = response.status_code == 200
+        NEXTJS_POST_SECONDS.labels("delivered" if ok else "failed").observe(time.perf_counter() - started)
+        if not ok:
+            self.last_error = f"HTTP {response.status_code}"
+            return False, response
+        self.last_error = None
+        self.last_delivered_at = time.time()
+        return True, response
+
+    @staticmethod
+    def retryable(response):
+        """Whether a failed POST (``response`` None for a connection error) may succeed later."""
+        return response is None or response.status_code >= 500 or response.status_code == 429
+
+    def _reject(self, payload, response):
+        self.rejected += 1
+        print(f"Next.js rejected batch of {len(payload)} species (HTTP {response.status_code}); "
+              f"moved to {self.rejected_path}")
+        try:
+            with open(self.rejected_path, "a") as f:
+                f.write(json.dumps({"rejectedAt": time.time(), "status": response.status_code,
+                                    "response": response.text[:500], "payload": payload}) + "\n")
+        except OSError as e:
+            print(f"Could not write {self.rejected_path}: {e}")
+
+    def post(self, payload):
+        """Deliver one payload now (spooling it on failure). Returns ``(delivered, response or None)``."""
+        self.start()
+        with self._send_lock:
+            backlog = self.spool.pending
+            # Keep order: nothing overtakes batches already waiting in the spool
+            ok, response = (False, None) if backlog else self._post(payload)
+            if ok:
+                self.delivered += 1
+            elif not self.retryable(response):
+                self._reject(payload, response)
+            else:
+                self.spool.append(payload)
+                self.spooled += 1
+                if backlog:
+                    print(f"Spooled batch of {len(payload)} species behind {backlog} undelivered batch(es)")
+                else:
+                    print(f"Next.js unavailable ({self.last_error}); spooled batch of {len(payload)} species")
+        if not ok:
+            with self._cond:
+                self._cond.notify_all()  # let the worker schedule a replay
+        return ok, response
+
+    def _replay_locked(self):
+        while True:
+            entry = self.spool.peek()
+            if entry is None:
+                return
+            payload, next_offset = entry
+            ok, response = self._post(payload)
+            if not ok and self.retryable(response):
+                return
+            self.spool.commit(next_offset)
+            if ok:
+                self.replayed += 1
+                self.delivered += 1
+            else:
+                self._reject(payload, response)
+            if not self.spool.pending:
+                print("Next.js spool drained")
+
+    def _run(self):
+        next_retry = 0.0
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    if self._buffer and (now - self._first_at >= self.window or len(self._buffer) >= self.max_batch):
+                        break
+                    if self.spool.pending and now >= next_retry:
+                        break
+                    waits = []
+                    if self._buffer:
+                        waits.append(self._first_at + self.window - now)
+                    if self.spool.pending:
+                        waits.append(next_retry - now)
+                    self._cond.wait(min(waits) if waits else None)
+                batch, self._buffer = self._buffer, []
+            if batch:
+                payload = batch[-1]
+                self.batches += 1
+                self.superseded += len(batch) - 1
+                ok, _ = self.post(payload)
+                if ok:
+                    print(f"Successfully sent data to Next.js: {len(payload)} species "
+                          f"(newest of {len(batch)} result(s))")
+            if self.spool.pending and time.time() >= next_retry:
+                with self._send_lock:
+                    self._replay_locked()
+                next_retry = time.time() + self.retry_interval
+
+    def status(self):
+        with self._cond:
+            buffered = len(self._buffer)
+        return {
+            "url": self.url,
+            "windowSeconds": self.window,
+            "results": self.results,
+            "batches": self.batches,
+            "superseded": self.superseded,
+            "buffered": buffered,
+            "delivered": self.delivered,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "rejected": self.rejected,
+            "rejectedPath": self.rejected_path,
+            "spoolPending": self.spool.pending,
+            "spoolPath": self.spool.path,
+            "lastError": self.last_error,
+            "lastDeliveredAt": self.last_delivered_at,
+        }
+
+
+def run_fake_ingest(host="127.0.0.1", port=3000, latency=0.01, failure_rate=0.0):
+    """Local stand-in for the Next.js ``/api/phytoplankton`` ingest route.
+
+    Accepts JSON arrays and answers like the real route after ``latency``
+    seconds; a fraction ``failure_rate`` of requests get a 503. Accepted
+    payloads are kept in ``server.received`` in arrival order.
+    """
+    received = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            if random.random() < failure_rate:
+                code, payload = 503, {"error": "unavailable"}
+            elif not isinstance(data, list):
+                code, payload = 400, {"error": "Expected an array"}
+            else:
+                with lock:
+                    received.append(data)
+                code, payload = 200, {"ok": True, "count": len(data)}
+            out = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.received = received
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Next.js ingest endpoint")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = run_fake_ingest(port=args.port, latency=args.latency, failure_rate=args.failure_rate)
+    print(f"Stand-in Next.js ingest listening on http://127.0.0.1:{args.port}/api/phytoplankton")
+    server.serve_forever()
@@ -0,0 +1,201 @@
+import threading
+import time
+
+import numpy as np
+
+# Bucket widths (seconds) of the incrementally maintained rollups, finest first
+ROLLUP_LEVELS = (10, 60, 600, 3600)
+
+
+def bucket_stats(ts, values, start, end, points):
+    """Min/max/mean/count of ``values`` in ``points`` equal-width time buckets over ``[start, end)``.
+
+    Fully vectorized: samples are binned by integer division and reduced with
+    ``bincount`` and ``minimum/maximum.at``. Empty buckets are omitted.
+    """
+    ts = np.asarray(ts, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = (ts >= start) & (ts < end) & ~np.isnan(values)
+    ts, values = ts[keep], values[keep]
+    width = (end - start) / points
+    idx = np.minimum(((ts - start) / width).astype(np.int64), points - 1)
+    count = np.bincount(idx, minlength=points)
+    total = np.bincount(idx, weights=values, minlength=points)
+    lo = np.full(points, np.inf)
+    hi = np.full(points, -np.inf)
+    np.minimum.at(lo, idx, values)
+    np.maximum.at(hi, idx, values)
+    nonempty = count > 0
+    centers = start + (np.arange(points) + 0.5) * width
+    return {
+        "t": centers[nonempty],
+        "min": lo[nonempty],
+        "max": hi[nonempty],
+        "mean": total[nonempty] / count[nonempty],
+        "count": count[nonempty],
+    }
+
+
+def merge_buckets(t, count, total, lo, hi, start, end, points):
+    """Re-bucket pre-aggregated buckets (count/sum/min/max at times ``t``) into ``points`` buckets."""
+    t = np.asarray(t, dtype=np.float64)
+    keep = (t >= start) & (t < end) & (np.asarray(count) > 0)
+    t, count, total, lo, hi = t[keep], np.asarray(count)[keep], np.asarray(total)[keep], \
+        np.asarray(lo)[keep], np.asarray(hi)[keep]
+    width = (end - start) / points
+    idx = np.minimum(((t - start) / width).astype(np.int64), points - 1)
+    n = np.bincount(idx, weights=count, minlength=points)
+    s = np.bincount(idx, weights=total, minlength=points)
+    out_lo = np.full(points, np.inf)
+    out_hi = np.full(points, -np.inf)
+    np.minimum.at(out_lo, idx, lo)
+    np.maximum.at(out_hi, idx, hi)
+    nonempty = n > 0
+    centers = start + (np.arange(points) + 0.5) * width
+    return {
+        "t": centers[nonempty],
+        "min": out_lo[nonempty],
+        "max": out_hi[nonempty],
+        "mean": s[nonempty] / n[nonempty],
+        "count": n[nonempty].astype(np.int64),
+    }
+
+
+def lttb(t, values, points):
+    """Largest-Triangle-Three-Buckets downsampling to at most ``points`` points.
+
+    Keeps the first and last point; for each bucket in between picks the point
+    forming the largest triangle with the previously selected point and the
+    mean of the next bucket. The per-bucket search is vectorized.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    v = np.asarray(values, dtype=np.float64)
+    keep = ~np.isnan(v)
+    t, v = t[keep], v[keep]
+    n = len(t)
+    if points >= n or points < 3:
+        return {"t": t, "v": v}
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Means of every bucket, used as the third triangle vertex of the bucket before it
+    sums_t = np.add.reduceat(t[1:n - 1], edges[:-1] - 1)
+    sums_v = np.add.reduceat(v[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    mean_t = np.append(sums_t / sizes, t[-1])
+    mean_v = np.append(sums_v / sizes, v[-1])
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for b in range(points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ct, cv = mean_t[b + 1], mean_v[b + 1]
+        area = np.abs((t[a] - ct) * (v[lo:hi] - v[a]) - (t[a] - t[lo:hi]) * (cv - v[a]))
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    selected[-1] = n - 1
+    return {"t": t[selected], "v": v[selected]}
+
+
+class SeriesRollups:
+    """Count/sum/min/max buckets per series at several resolutions, updated as samples arrive.
+
+    ``add`` folds a sample into one bucket per level (O(levels)), so coarse
+    views never have to be recomputed from raw rows. Each level keeps its
+    newest ``max_buckets`` buckets. Rollups only cover samples seen since
+    ``since``; older ranges must be served from the raw store.
+    """
+
+    def __init__(self, levels=ROLLUP_LEVELS, max_buckets=20000):
+        self.levels = tuple(sorted(levels))
+        self.max_buckets = max_buckets
+        self.since = time.time()
+        self._series = {}  # key -> [ {bucket: [count, sum, min, max]} per level ]
+        self._lock = threading.Lock()
+        self.samples = 0
+
+    def add(self, key, ts, value):
+        if value is None:
+            return
+        value = float(value)
+        if value != value:  # NaN
+            return
+        with self._lock:
+            levels = self._series.get(key)
+            if levels is None:
+                levels = self._series[key] = [{} for _ in self.levels]
+            for width, buckets in zip(self.levels, levels):
+                b = int(ts // width)
+                entry = buckets.get(b)
+                if entry is None:
+                    buckets[b] = [1, value, value, value]
+                    if len(buckets) > self.max_buckets:
+                        del buckets[next(iter(buckets))]
+                else:
+                    entry[0] += 1
+                    entry[1] += value
+                    if value < entry[2]:
+                        entry[2] = value
+                    if value > entry[3]:
+                        entry[3] = value
+            self.samples += 1
+
+    def covers(self, key, start):
+        """True when rollups hold every sample of ``key`` from ``start`` on."""
+        if start < self.since:
+            return False
+        with self._lock:
+            levels = self._series.get(key)
+            if levels is None:
+                return True
+            # Eviction drops the finest levels' history first; the coarsest reaches back furthest
+            oldest = next(iter(levels[-1]), None)
+            return oldest is None or oldest * self.levels[-1] <= start
+
+    def level_for(self, start, end, points):
+        """Coarsest level that still gives at least ``points`` buckets over the range."""
+        chosen = 0
+        for i, width in enumerate(self.levels):
+            if (end - start) / width >= points:
+                chosen = i
+        return chosen
+
+    def buckets(self, key, start, end, points):
+        """Pre-aggregated buckets of ``key`` overlapping the range, as arrays (t, count, sum, min, max)."""
+        level = self.level_for(start, end, points)
+        with self._lock:
+            levels = self._series.get(key)
+            # Move to coarser levels when eviction dropped the range start from this one
+            while levels and level < len(self.levels) - 1:
+                oldest = next(iter(levels[level]), None)
+                if oldest is None or oldest * self.levels[level] <= start:
+                    break
+                level += 1
+            width = self.levels[level]
+            rows = [] if levels is None else [
+                (b, e[0], e[1], e[2], e[3]) for b, e in levels[level].items()
+                if start // width <= b <= end // width
+            ]
+        arr = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        return (arr[:, 0] * width + width / 2, arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4]), width
+
+    def aggregate(self, key, start, end, points):
+        """Min/max/mean/count buckets of ``key`` from the rollups, at most ``points`` of them.
+
+        Output buckets are whole multiples of the rollup width and aligned to
+        it, so the values are exact rather than approximated across edges.
+        """
+        (t, count, total, lo, hi), width = self.buckets(key, start, end, points)
+        aligned_start = np.floor(start / width) * width
+        # Sized over the aligned span, which can be up to one rollup wider than end - start
+        out_width = max(1, int(np.ceil((end - aligned_start) / points / width))) * width
+        n_out = max(1, min(points, int(np.ceil((end - aligned_start) / out_width))))
+        return merge_buckets(t, count, total, lo, hi, aligned_start, aligned_start + n_out * out_width, n_out)
+
+    def status(self):
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "samples": self.samples,
+                "levels": list(self.levels),
+                "since": self.since,
+                "buckets": sum(len(b) for levels in self._series.values() for b in levels),
+            }
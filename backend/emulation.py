@@ -0,0 +1,236 @@
+import heapq
+import itertools
+import threading
+import time
+
+import metrics
+from sse import SSEBroadcaster
+
+
+class TooManySessions(Exception):
+    """Every session slot is taken by a running or watched session."""
+
+
+TICK_SECONDS = metrics.histogram("emulation_tick_seconds", "Emulation tick processing time (read, threshold update, broadcast)")
+
+
+class EmulationSession:
+    """One emulation run: its own dataset, clock, threshold state and SSE subscribers.
+
+    Sessions don't own a thread; the shared ``EmulationScheduler`` calls ``tick``
+    whenever the session's next batch is due.
+    """
+
+    def __init__(self, session_id, dataset, engine, duration_seconds=15 * 60, interval_seconds=5.0,
+                 broadcaster=None, on_batch=None):
+        self.id = session_id
+        self.engine = engine
+        self.duration_seconds = duration_seconds
+        self.interval_seconds = interval_seconds
+        self.running = False
+        self.run_id = 0
+        self.start_time = None
+        self.index = 0
+        self.ts_index = 0
+        self.broadcaster = broadcaster or SSEBroadcaster()
+        self.on_batch = on_batch  # called as on_batch(session_id, timestamp, ticks) after each batch
+        self.dataset = dataset
+        self.lock = threading.Lock()  # serializes configure-and-start / stop of this session
+        self.last_active = time.time()
+
+    def load(self, dataset):
+        """Replace the session's dataset (only while stopped)."""
+        self.dataset = dataset
+
+    def start(self):
+        """Reset state and start the clock. Returns False if already running or there is no data."""
+        if self.running or not len(self.dataset):
+            return False
+        self.index = 0
+        self.ts_index = 0
+        self.engine.reset()
+        self.start_time = self.last_active = time.time()
+        self.run_id += 1
+        self.running = True
+        self.broadcast({"type": "emulation_status", "running": True})
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._finish()
+        return True
+
+    def _finish(self):
+        self.running = False
+        self.last_active = time.time()
+        self.broadcast({"type": "emulation_complete"})
+
+    def tick(self):
+        """Emit all species for the next logical timestamp together as a batch. Returns False once finished."""
+        if not self.running:
+            return False
+        if time.time() - self.start_time >= self.duration_seconds:
+            self._finish()
+            return False
+        started = time.perf_counter()
+        # Batches are read from the dataset lazily as the clock reaches them
+        i = self.ts_index % len(self.dataset)
+        ts = self.dataset.timestamp(i)
+        batch_raw = self.dataset.batch(i)
+        batch_enriched = self.engine.process_batch(batch_raw)
+        self.broadcast({
+            "type": "emulation_tick_batch",
+            "timestamp": ts,
+            "records": batch_enriched
+        })
+        if self.on_batch:
+            self.on_batch(self.id, ts, batch_enriched)
+        self.ts_index += 1
+        self.index += len(batch_raw)
+        TICK_SECONDS.observe(time.perf_counter() - started)
+        return True
+
+    def broadcast(self, payload: dict):
+        self.broadcaster.publish(payload)
+
+    def status_event(self):
+        """First event every SSE client gets on connecting."""
+        return {"type": "emulation_status", "running": self.running}
+
+    def sse_generator(self, last_event_id=None):
+        # Immediately push status, then events (replayed after last_event_id when resuming)
+        return self.broadcaster.stream(last_event_id=last_event_id, initial=self.status_event())
+
+    def status(self):
+        elapsed = (time.time() - self.start_time) if self.start_time else 0
+        sse = self.broadcaster.status()
+        return {
+            'id': self.id,
+            'running': self.running,
+            'elapsedSeconds': elapsed,
+            'remainingSeconds': max(0, self.duration_seconds - elapsed) if self.running else 0,
+            'durationSeconds': self.duration_seconds,
+            'intervalSeconds': self.interval_seconds,
+            'index': self.index,
+            'listeners': sse['clients'],
+            'sse': sse,
+        }
+
+
+class EmulationScheduler:
+    """Single thread that drives every running session on its own interval."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, session, delay=0.0):
+        with self._cond:
+            heapq.heappush(self._heap, (time.time() + delay, next(self._seq), session, session.run_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="emulation-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due = self._heap[0][0]
+                    delay = due - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                due, _, session, run_id = heapq.heappop(self._heap)
+            if run_id != session.run_id:
+                # Stale entry from a run that was stopped and restarted
+                continue
+            try:
+                more = session.tick()
+            except Exception as e:
+                print(f"Emulation session {session.id} tick failed: {e}")
+                more = session.running
+            if more:
+                with self._cond:
+                    # Next slot is relative to this one's deadline so sessions don't drift
+                    heapq.heappush(self._heap, (max(due + session.interval_seconds, time.time()),
+                                                next(self._seq), session, run_id))
+
+
+class EmulationManager:
+    """Registry of emulation sessions sharing one scheduler thread.
+
+    Each session keeps a replay buffer of SSE events, so the registry is
+    bounded: a session that is stopped and has no SSE clients is evicted after
+    ``idle_seconds``, and once ``max_sessions`` exist a new one first evicts the
+    longest-idle such session (``TooManySessions`` if none qualifies).
+    """
+
+    def __init__(self, scheduler=None, max_sessions=32, idle_seconds=600.0):
+        self.scheduler = scheduler or EmulationScheduler()
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    @staticmethod
+    def _idle(session):
+        return not session.running and session.broadcaster.status()["clients"] == 0
+
+    def _evict_locked(self, now):
+        for session_id, session in list(self._sessions.items()):
+            if self._idle(session) and now - session.last_active >= self.idle_seconds:
+                del self._sessions[session_id]
+                self.evicted += 1
+        if len(self._sessions) < self.max_sessions:
+            return
+        idle = [s for s in self._sessions.values() if self._idle(s)]
+        if not idle:
+            raise TooManySessions(f"All {self.max_sessions} emulation sessions are in use")
+        del self._sessions[min(idle, key=lambda s: s.last_active).id]
+        self.evicted += 1
+
+    def get_or_create(self, session_id, factory):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._evict_locked(time.time())
+                session = factory()
+                self._sessions[session_id] = session
+            return session
+
+    def remove(self, session_id):
+        """Stop a session and drop it (and its replay buffer). Returns the session, or None if unknown."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            with session.lock:
+                session.stop()
+        return session
+
+    def start(self, session):
+        """Start a session; callers configuring it first should hold ``session.lock`` around both."""
+        if not session.start():
+            return False
+        self.scheduler.schedule(session)
+        return True
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def status(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "maxSessions": self.max_sessions,
+                    "idleSeconds": self.idle_seconds, "evicted": self.evicted}
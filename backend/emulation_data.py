@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+INDEX_MAGIC = b"EMUIDX02"
+# magic, source size, source mtime, timestamp count, record count, names blob size
+_HEADER = struct.Struct("<8sQdQQQ")
+_TS_DTYPE = np.dtype([("first", "<u8"), ("count", "<u4"), ("name_len", "<u4"), ("name_off", "<u8")])
+_REC_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("pad", "<u4")])
+
+
+def _timestamp_key(rec):
+    return rec.get('timestamp') or 'unknown'
+
+
+class InMemoryDataset:
+    """Records held in memory and grouped by timestamp (the original JSON array format)."""
+
+    def __init__(self, records):
+        # Group raw data by timestamp key to batch species simultaneously
+        self._grouped = {}
+        for rec in records:
+            self._grouped.setdefault(_timestamp_key(rec), []).append(rec)
+        self._ordered_ts = sorted(self._grouped.keys())
+        self.record_count = len(records)
+
+    def __len__(self):
+        return len(self._ordered_ts)
+
+    def timestamp(self, i):
+        return self._ordered_ts[i]
+
+    def batch(self, i):
+        return self._grouped[self._ordered_ts[i]]
+
+
+class IndexedNDJSONDataset:
+    """NDJSON dataset read lazily through a memory-mapped timestamp index.
+
+    The index lists timestamps in sorted order, each pointing at the byte
+    ranges of its records in the data file. Opening costs two ``mmap`` calls;
+    a batch is parsed only when the emulation clock reaches it. Timestamps
+    are stored as JSON, so they come back with the type they had in the data.
+    """
+
+    def __init__(self, path, index_path):
+        self.path = path
+        self.index_path = index_path
+        # Kept open so batch() can check the mapped file wasn't truncated under us
+        self._file = open(path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(index_path, 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, _, n_ts, n_rec, names_size = _HEADER.unpack_from(self._index, 0)
+        offset = _HEADER.size
+        self._ts = (np.frombuffer(self._index, dtype=_TS_DTYPE, count=n_ts, offset=offset)
+                    if n_ts else np.zeros(0, dtype=_TS_DTYPE))
+        offset += n_ts * _TS_DTYPE.itemsize
+        self._recs = (np.frombuffer(self._index, dtype=_REC_DTYPE, count=n_rec, offset=offset)
+                      if n_rec else np.zeros(0, dtype=_REC_DTYPE))
+        self._names_offset = offset + n_rec * _REC_DTYPE.itemsize
+        self.record_count = int(n_rec)
+
+    def __len__(self):
+        return len(self._ts)
+
+    def timestamp(self, i):
+        entry = self._ts[i]
+        start = self._names_offset + int(entry["name_off"])
+        return json.loads(self._index[start:start + int(entry["name_len"])])
+
+    def batch(self, i):
+        entry = self._ts[i]
+        first = int(entry["first"])
+        rows = self._recs[first:first + int(entry["count"])]
+        offsets, lengths = rows["offset"].tolist(), rows["length"].tolist()
+        # Touching mapped pages past the end of a truncated file would SIGBUS the process
+        end = max((o + n for o, n in zip(offsets, lengths)), default=0)
+        if os.fstat(self._file.fileno()).st_size < end:
+            raise ValueError(f"{self.path} was truncated after it was opened")
+        data = self._data
+        return [json.loads(data[o:o + n]) for o, n in zip(offsets, lengths)]
+
+    def close(self):
+        """Release the maps and the data file; the dataset is empty afterwards."""
+        # numpy views pin the index map, so drop them before closing it
+        self._ts = np.zeros(0, dtype=_TS_DTYPE)
+        self._recs = np.zeros(0, dtype=_REC_DTYPE)
+        self._index.close()
+        self._data.close()
+        self._file.close()
+
+
+def _scan_ndjson(path):
+    """Yield (timestamp, offset, length) for every non-empty line of an NDJSON file."""
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            length = len(line)
+            body = line.strip()
+            if body:
+                rec = json.loads(body)
+                if isinstance(rec, dict):
+                    yield _timestamp_key(rec), offset, len(line.rstrip(b"\r\n"))
+            offset += length
+
+
+def build_index(path, index_path):
+    """Scan an NDJSON dataset once and write its timestamp -> record offsets index."""
+    grouped = {}
+    for ts, offset, length in _scan_ndjson(path):
+        grouped.setdefault(ts, []).append((offset, length))
+    ordered_ts = sorted(grouped.keys())
+
+    ts_table = np.zeros(len(ordered_ts), dtype=_TS_DTYPE)
+    n_rec = sum(len(v) for v in grouped.values())
+    rec_table = np.zeros(n_rec, dtype=_REC_DTYPE)
+    names = bytearray()
+    first = 0
+    for i, ts in enumerate(ordered_ts):
+        recs = grouped[ts]
+        name = json.dumps(ts).encode('utf-8')  # JSON allows numeric timestamps; keep their type
+        ts_table[i] = (first, len(recs), len(name), len(names))
+        names += name
+        for j, (offset, length) in enumerate(recs):
+            rec_table[first + j] = (offset, length, 0)
+        first += len(recs)
+
+    st = os.stat(path)
+    tmp = f"{index_path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, st.st_size, st.st_mtime, len(ordered_ts), n_rec, len(names)))
+        f.write(ts_table.tobytes())
+        f.write(rec_table.tobytes())
+        f.write(bytes(names))
+    os.replace(tmp, index_path)
+    print(f"Indexed {path}: {n_rec} records, {len(ordered_ts)} timestamps")
+    return index_path
+
+
+def _index_is_current(path, index_path):
+    try:
+        st = os.stat(path)
+        with open(index_path, 'rb') as f:
+            header = f.read(_HEADER.size)
+        magic, size, mtime, _, _, _ = _HEADER.unpack(header)
+        return magic == INDEX_MAGIC and size == st.st_size and mtime == st.st_mtime
+    except (OSError, struct.error):
+        return False
+
+
+def _index_path_for(path):
+    index_path = f"{path}.idx"
+    if os.access(os.path.dirname(os.path.abspath(path)), os.W_OK) or os.path.exists(index_path):
+        return index_path
+    # Read-only data directory: keep the index in the temp dir instead
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"emulation-{digest}.idx")
+
+
+def _is_json_array(path):
+    with open(path, 'rb') as f:
+        while True:
+            ch = f.read(1)
+            if not ch or not ch.isspace():
+                return ch == b'['
+
+
+def open_dataset(path):
+    """Open an emulation dataset.
+
+    A JSON array file is loaded into memory as before. NDJSON (one record per
+    line) is indexed on first use and then read lazily through the index.
+    """
+    if os.path.getsize(path) == 0:
+        return InMemoryDataset([])
+    if _is_json_array(path):
+        with open(path, 'r') as f:
+            records = json.load(f)
+        return InMemoryDataset(records if isinstance(records, list) else [])
+    index_path = _index_path_for(path)
+    if not _index_is_current(path, index_path):
+        build_index(path, index_path)
+    return IndexedNDJSONDataset(path, index_path)
+
+
+def convert_to_ndjson(src, dst):
+    """Rewrite a JSON array dataset as NDJSON, one record per line."""
+    with open(src, 'r') as f:
+        records = json.load(f)
+    with open(dst, 'w') as f:
+        for rec in records:
+            f.write(json.dumps(rec, separators=(',', ':')))
+            f.write("\n")
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulation dataset tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="convert a JSON array dataset to NDJSON")
+    conv.add_argument("src")
+    conv.add_argument("dst")
+    idx = sub.add_parser("index", help="(re)build the timestamp index of an NDJSON dataset")
+    idx.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        print(f"Wrote {convert_to_ndjson(args.src, args.dst)} records to {args.dst}")
+    else:
+        build_index(args.path, _index_path_for(args.path))
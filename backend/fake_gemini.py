@@ -0,0 +1,109 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = json.dumps([
+    {
+        "phytoplanktonscientificName": "Pseudo-nitzschia australis",
+        "no of that pyhtoplankon": "12",
+        "Genus": "Pseudo-nitzschia",
+        "Confidence": "87",
+        "optimalPh": "8.1",
+        "optimalTemp": "18",
+        "photosynthetic": True,
+        "alertLevel": "Low",
+        "Area_Concentration": "120",
+        "Sample_Volume": "1",
+        "Dissolved_Oxygen": "7.2"
+    }
+], indent=2)
+
+
+def run_fake_gemini(host="127.0.0.1", port=8090, latency=0.5, jitter=0.0, tail_rate=0.0, tail_latency=10.0,
+                    rate_limit_rate=0.0, reply=DEFAULT_REPLY):
+    """Local stand-in for the Gemini REST API (``generateContent`` only).
+
+    Every request waits ``latency`` (+ uniform ``jitter``) seconds; a fraction
+    ``tail_rate`` waits ``tail_latency`` instead, and a fraction
+    ``rate_limit_rate`` is answered with a 429 RESOURCE_EXHAUSTED error. The
+    reply text is wrapped in a fenced ```json block like the real model does;
+    batched requests get the same reply once per labeled frame.
+    Requests per API key are counted in ``server.requests_by_key``.
+    """
+    requests_by_key = Counter()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def _send(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            key = self.headers.get("x-goog-api-key") or "anonymous"
+            with lock:
+                requests_by_key[key] += 1
+            if ":generateContent" not in self.path:
+                self._send(404, {"error": {"code": 404, "message": f"Unsupported path {self.path}", "status": "NOT_FOUND"}})
+                return
+            if random.random() < rate_limit_rate:
+                self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                           "message": "Resource has been exhausted (e.g. check quota)."}})
+                return
+            delay = tail_latency if random.random() < tail_rate else latency + random.uniform(0, jitter)
+            time.sleep(delay)
+            prompt_tokens = 258 + len(request_body) // 4000
+            frames = len(re.findall(rb'"Frame \d+:"', request_body)) if b"BATCH MODE" in request_body else 0
+            if frames:
+                species = json.loads(reply)
+                text = f"```json\n{json.dumps([{'frame': n, 'species': species} for n in range(1, frames + 1)])}\n```"
+            else:
+                text = f"```json\n{reply}\n```"
+            candidate_tokens = len(text) // 4
+            self._send(200, {
+                "candidates": [{
+                    "content": {"parts": [{"text": text}], "role": "model"},
+                    "finishReason": "STOP",
+                    "index": 0,
+                }],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "candidatesTokenCount": candidate_tokens,
+                    "totalTokenCount": prompt_tokens + candidate_tokens,
+                },
+            })
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.requests_by_key = requests_by_key
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini generateContent API")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--tail-latency", type=float, default=10.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = run_fake_gemini(port=args.port, latency=args.latency, jitter=args.jitter, tail_rate=args.tail_rate,
+                             tail_latency=args.tail_latency, rate_limit_rate=args.rate_limit_rate)
+    print(f"Fake Gemini listening on http://127.0.0.1:{args.port} (set GEMINI_API_ENDPOINT to this URL)")
+    server.serve_forever()
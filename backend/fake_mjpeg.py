@@ -0,0 +1,95 @@
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+BOUNDARY = "fakeframe"
+
+
+def synthetic_frames(width=1280, height=720, count=30, quality=80, seed=0):
+    """JPEG frames of a bright circular field of view with a few drifting dark particles."""
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(0.3, 0.7, size=(12, 2)) * (width, height)
+    velocity = rng.uniform(-3, 3, size=(12, 2))
+    frames = []
+    for i in range(count):
+        image = np.full((height, width, 3), 12, dtype=np.uint8)
+        cv2.circle(image, (width // 2, height // 2), int(min(width, height) * 0.45), (200, 205, 195), -1)
+        for x, y in positions + velocity * i:
+            cv2.ellipse(image, (int(x), int(y)), (9, 4), (i * 7) % 180, 0, 360, (60, 80, 50), -1)
+        noise = rng.integers(0, 6, size=image.shape, dtype=np.uint8)
+        ok, jpeg = cv2.imencode(".jpg", cv2.add(image, noise), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(jpeg.tobytes())
+    return frames
+
+
+def run_fake_mjpeg(host="127.0.0.1", port=8081, fps=30.0, frames=None, width=1280, height=720):
+    """Local stand-in for a phone/IP camera MJPEG endpoint (any path).
+
+    Streams ``frames`` (JPEG bytes, default ``synthetic_frames``) in a loop as
+    ``multipart/x-mixed-replace`` at ``fps`` frames per second per client;
+    ``fps`` 0 sends as fast as the client reads. Parts carry Content-Length
+    like most camera apps. Frames and bytes sent are counted on the server.
+    """
+    frames = frames or synthetic_frames(width, height)
+    counters = {"clients": 0, "frames": 0, "bytes": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            with lock:
+                counters["clients"] += 1
+            interval = 1.0 / fps if fps > 0 else 0.0
+            next_at = time.perf_counter()
+            i = 0
+            try:
+                while True:
+                    jpeg = frames[i % len(frames)]
+                    part = (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n"
+                            .encode() + jpeg + b"\r\n")
+                    self.wfile.write(part)
+                    with lock:
+                        counters["frames"] += 1
+                        counters["bytes"] += len(part)
+                    i += 1
+                    if interval:
+                        next_at += interval
+                        delay = next_at - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                        else:
+                            next_at = time.perf_counter()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                with lock:
+                    counters["clients"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.counters = counters
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in MJPEG camera")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+    server = run_fake_mjpeg(port=args.port, fps=args.fps, width=args.width, height=args.height)
+    print(f"Fake MJPEG camera on http://127.0.0.1:{args.port}/video (set PHONE_MJPEG_URL to this URL)")
+    server.serve_forever()
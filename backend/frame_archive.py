@@ -0,0 +1,349 @@
+import argparse
+import glob
+import mmap
+import os
+import threading
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+
+ARCHIVE_MAGIC = b"FRMARC01"
+INDEX_NAME = "index.bin"
+REPLAY_PREFIX = "replay:"
+# capture time, segment number, byte offset and length of one JPEG in that segment
+_INDEX_DTYPE = np.dtype([("ts", "<f8"), ("segment", "<u4"), ("length", "<u4"), ("offset", "<u8")])
+
+
+def _segment_path(directory, segment):
+    return os.path.join(directory, f"segment-{segment:05d}.mjpg")
+
+
+class FrameArchiveWriter:
+    """Appends JPEG frames to a segmented archive directory.
+
+    Frames are concatenated as-is into ``segment-NNNNN.mjpg`` files that roll
+    over at ``segment_bytes``; ``index.bin`` holds one fixed-size record per
+    frame (capture time, segment, offset, length). Index records are held back
+    and written (unbuffered) only after the segment bytes they point to have
+    been flushed, so an archive that is still being written can be read up to
+    its last complete index record.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, flush_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, INDEX_NAME)
+        existing = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        if existing and _read_magic(index_path) != ARCHIVE_MAGIC:
+            raise ValueError(f"Not a frame archive: {directory}")
+        if existing:
+            self._drop_torn_tail(index_path, existing)
+        self._index = open(index_path, "ab", buffering=0)
+        self._pending = []  # index records whose frames are not flushed yet
+        if not existing:
+            self._index.write(ARCHIVE_MAGIC)
+        # Appending to an existing archive starts a fresh segment
+        self.segment = len(glob.glob(os.path.join(directory, "segment-*.mjpg")))
+        self._segment = None
+        self._segment_size = 0
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+
+    def _drop_torn_tail(self, index_path, size):
+        """Cut off a final record left half-written by a crash so appends stay record-aligned."""
+        whole = len(ARCHIVE_MAGIC) + (size - len(ARCHIVE_MAGIC)) // _INDEX_DTYPE.itemsize * _INDEX_DTYPE.itemsize
+        if whole != size:
+            with open(index_path, "rb+") as f:
+                f.truncate(whole)
+            print(f"Dropped torn record at the end of {index_path}")
+
+    def _open_segment(self):
+        if self._segment is not None:
+            self._flush_locked()
+            self._segment.close()
+            self.segment += 1
+        self._segment = open(_segment_path(self.directory, self.segment), "wb")
+        self._segment_size = 0
+
+    def write(self, jpeg, ts=None):
+        """Append one encoded frame captured at ``ts`` (default now)."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if self._segment is None or (self._segment_size and
+                                         self._segment_size + len(jpeg) > self.segment_bytes):
+                self._open_segment()
+            record = np.array([(ts, self.segment, len(jpeg), self._segment_size)], dtype=_INDEX_DTYPE)
+            self._segment.write(jpeg)
+            self._pending.append(record.tobytes())
+            self._segment_size += len(jpeg)
+            self.frames += 1
+            self.bytes += len(jpeg)
+            if time.time() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._segment is not None:
+            self._segment.flush()
+        if self._pending:
+            self._index.write(b"".join(self._pending))
+            self._pending.clear()
+        self._last_flush = time.time()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._segment is not None:
+                self._segment.close()
+            self._index.close()
+
+
+def _read_magic(index_path):
+    with open(index_path, "rb") as f:
+        return f.read(len(ARCHIVE_MAGIC))
+
+
+class FrameArchive:
+    """Read-only view of an archive: the index is memory-mapped, segments are mapped on first use."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        index_path = os.path.join(directory, INDEX_NAME)
+        if _read_magic(index_path) != ARCHIVE_MAGIC:
+            raise ValueError(f"Not a frame archive: {directory}")
+        with open(index_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # A torn final record (archive still being written) is ignored
+        count = (len(self._mmap) - len(ARCHIVE_MAGIC)) // _INDEX_DTYPE.itemsize
+        self._index = np.frombuffer(self._mmap, dtype=_INDEX_DTYPE, count=count, offset=len(ARCHIVE_MAGIC))
+        self.timestamps = self._index["ts"]
+        self._segments = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def duration(self):
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+    @property
+    def bytes(self):
+        return int(self._index["length"].sum())
+
+    def _segment(self, segment, end):
+        """Map of a segment covering at least ``end`` bytes, remapped if it has grown since."""
+        data = self._segments.get(segment)
+        if data is None or len(data) < end:
+            with open(_segment_path(self.directory, segment), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < end:
+                    raise ValueError(f"Segment {segment} of {self.directory} is shorter than its index "
+                                     f"({size} < {end} bytes)")
+                if data is not None:
+                    data.close()
+                data = self._segments[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return data
+
+    def frame(self, i):
+        """Encoded bytes of frame ``i``."""
+        entry = self._index[i]
+        offset, length = int(entry["offset"]), int(entry["length"])
+        if not length:
+            return b""
+        return self._segment(int(entry["segment"]), offset + length)[offset:offset + length]
+
+    def info(self):
+        n = len(self)
+        return {
+            "directory": self.directory,
+            "frames": n,
+            "bytes": self.bytes,
+            "segments": int(self._index["segment"].max()) + 1 if n else 0,
+            "durationSeconds": self.duration,
+            "fps": (n - 1) / self.duration if n > 1 and self.duration > 0 else None,
+        }
+
+
+def parse_replay_source(source):
+    """Split ``replay:<dir>[?speed=N]`` into ``(directory, speed)``; speed 0 (or ``max``) means unpaced."""
+    spec = source[len(REPLAY_PREFIX):]
+    directory, _, query = spec.partition("?")
+    value = parse_qs(query).get("speed", ["1"])[0]
+    speed = 0.0 if value == "max" else float(value)
+    if speed < 0:
+        raise ValueError(f"Replay speed must be >= 0: {value}")
+    return directory, speed
+
+
+def is_replay_source(source):
+    return isinstance(source, str) and source.startswith(REPLAY_PREFIX)
+
+
+class ReplayStats:
+    """Progress of one replay source, shared across the hub's reconnects."""
+
+    def __init__(self, source, directory, speed):
+        self.source = source
+        self.directory = directory
+        self.speed = speed
+        self.frames = 0
+        self.passes = 0
+        self.started_at = None
+        self.lag = 0.0
+
+    def status(self):
+        elapsed = (time.time() - self.started_at) if self.started_at else 0
+        return {
+            "source": self.source,
+            "speed": self.speed or "max",
+            "framesReplayed": self.frames,
+            "passes": self.passes,
+            "fps": (self.frames / elapsed) if elapsed else 0.0,
+            "lagSeconds": self.lag,
+        }
+
+
+_replays = {}
+_replays_lock = threading.Lock()
+
+
+def replay_frames(source):
+    """Yield the JPEG bytes of a ``replay:`` source, looping over the archive.
+
+    Frames are released on deadlines derived from their recorded timestamps
+    divided by ``speed``, so pacing doesn't drift with consumer time; when the
+    consumer falls behind, frames are sent back to back until it catches up
+    (``lagSeconds`` in the status). Speed 0 releases frames as fast as they
+    are taken.
+    """
+    directory, speed = parse_replay_source(source)
+    archive = FrameArchive(directory)
+    if not len(archive):
+        raise RuntimeError(f"Replay archive is empty: {directory}")
+    with _replays_lock:
+        stats = _replays.get(source)
+        if stats is None:
+            stats = _replays[source] = ReplayStats(source, directory, speed)
+    offsets = archive.timestamps - archive.timestamps[0]
+    # Loop gap: the median inter-frame time, so a looped archive keeps its cadence
+    gap = float(np.median(np.diff(archive.timestamps))) if len(archive) > 1 else 0.0
+    stats.started_at = stats.started_at or time.time()
+    while True:
+        started = time.perf_counter()
+        for i in range(len(archive)):
+            if speed:
+                delay = started + offsets[i] / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                stats.lag = max(0.0, -delay)
+            yield bytes(archive.frame(i))
+            stats.frames += 1
+        stats.passes += 1
+        if speed and gap > 0:
+            time.sleep(gap / speed)
+
+
+def replay_status():
+    with _replays_lock:
+        return [stats.status() for stats in _replays.values()]
+
+
+class HubRecorder:
+    """Records every frame published by a FrameHub into an archive, on its own thread.
+
+    Stops after ``seconds`` or ``max_frames`` when given, or on ``stop()``.
+    """
+
+    def __init__(self, hub, directory, seconds=None, max_frames=None, segment_bytes=64 * 1024 * 1024):
+        self.hub = hub
+        self.directory = directory
+        self.seconds = seconds
+        self.max_frames = max_frames
+        self.writer = FrameArchiveWriter(directory, segment_bytes=segment_bytes)
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+        self.stopped_at = None
+        self.error = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for jpeg, captured_at in self.hub.subscribe(timeout=1.0, timestamps=True):
+                if self._stop.is_set():
+                    break
+                self.writer.write(jpeg, ts=captured_at)
+                if self.max_frames and self.writer.frames >= self.max_frames:
+                    break
+                if self.seconds and time.time() - self.started_at >= self.seconds:
+                    break
+        except Exception as e:
+            self.error = str(e)
+            print(f"Recording to {self.directory} failed: {e}")
+        finally:
+            self.writer.close()
+            self.stopped_at = time.time()
+            print(f"Recorded {self.writer.frames} frames ({self.writer.bytes} bytes) to {self.directory}")
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        elapsed = ((self.stopped_at or time.time()) - self.started_at) if self.started_at else 0
+        return {
+            "source": str(self.hub.source),
+            "directory": self.directory,
+            "running": self.running,
+            "frames": self.writer.frames,
+            "bytes": self.writer.bytes,
+            "seconds": elapsed,
+            "fps": (self.writer.frames / elapsed) if elapsed else 0.0,
+            "error": self.error,
+        }
+
+
+def import_images(directory, paths, fps=10.0):
+    """Build an archive from still JPEG files, ``fps`` frames per second in the order given."""
+    writer = FrameArchiveWriter(directory)
+    start = time.time()
+    try:
+        for i, path in enumerate(paths):
+            with open(path, "rb") as f:
+                writer.write(f.read(), ts=start + i / fps)
+    finally:
+        writer.close()
+    return writer.frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Frame archive tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="summarize an archive")
+    info.add_argument("directory")
+    imp = sub.add_parser("import", help="build an archive from JPEG files")
+    imp.add_argument("directory")
+    imp.add_argument("images", nargs="+")
+    imp.add_argument("--fps", type=float, default=10.0)
+    imp.add_argument("--repeat", type=int, default=1, help="append the image list this many times")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = import_images(args.directory, args.images * args.repeat, fps=args.fps)
+        print(f"Wrote {count} frames to {args.directory}")
+    else:
+        for key, value in FrameArchive(args.directory).info().items():
+            print(f"{key}: {value}")
@@ -0,0 +1,273 @@
+import threading
+import time
+
+
+class FrameHub:
+    """One producer thread per video source, shared by any number of viewers.
+
+    The producer pulls already-encoded JPEG frames from ``frame_factory(source)``
+    and keeps only the newest one. Subscribers wait for the sequence number to
+    change and always take the latest frame, so a slow viewer skips frames
+    instead of building up a backlog.
+
+    The factory may also yield ``(jpeg, decoded)`` tuples; the decoded array is
+    kept alongside the JPEG in the same single slot and served by ``latest``.
+    Long-lived consumers such as auto-capture ``pin`` the hub to keep the source
+    open and warm between reads. When the source fails or ends, the producer
+    reopens it with exponential backoff for as long as anyone is attached.
+    """
+
+    def __init__(self, source, frame_factory, idle_timeout=5.0, warmup_frames=0,
+                 backoff_min=0.5, backoff_max=30.0):
+        self.source = source
+        self._frame_factory = frame_factory
+        self._idle_timeout = idle_timeout
+        self._warmup_frames = warmup_frames
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._frame = None
+        self._decoded = None
+        self._frame_time = None
+        self._seq = 0
+        self._subscribers = 0
+        self._pins = 0
+        self._running = False
+        self._generation = 0
+        self._thread = None
+        self._last_unsubscribe = time.time()
+        self.error = None
+        self.frames_produced = 0
+        self.reconnects = 0
+        self._listeners = []
+
+    def _ensure_running(self):
+        # Caller holds self._cond
+        if self._running:
+            return
+        self._running = True
+        self._generation += 1
+        self.error = None
+        self._frame = None
+        self._decoded = None
+        self._frame_time = None
+        self._last_unsubscribe = time.time()
+        self._thread = threading.Thread(target=self._produce, args=(self._generation,), daemon=True)
+        self._thread.start()
+
+    def _should_stop(self, generation):
+        # Deciding to stop and clearing _running happen under one lock hold, so a viewer arriving
+        # afterwards starts a fresh producer instead of waiting on this exiting one
+        with self._cond:
+            if generation != self._generation or not self._running:
+                return True
+            if self._subscribers > 0 or self._pins > 0:
+                return False
+            if time.time() - self._last_unsubscribe < self._idle_timeout:
+                return False
+            self._running = False
+            self._cond.notify_all()
+            return True
+
+    def _publish(self, item):
+        if isinstance(item, tuple):
+            jpeg, decoded = item
+        else:
+            jpeg, decoded = item, None
+        with self._cond:
+            self._frame = jpeg
+            self._decoded = decoded
+            self._frame_time = time.time()
+            self._seq += 1
+            self.frames_produced += 1
+            self.error = None
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    def add_listener(self, callback):
+        """Call ``callback()`` from the producer thread on every new frame and when the producer
+        stops; lets the asyncio server wait on many hubs without a thread per viewer."""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.remove(callback)
+
+    def _produce(self, generation):
+        backoff = self._backoff_min
+        try:
+            while not self._should_stop(generation):
+                frames = None
+                try:
+                    frames = self._frame_factory(self.source)
+                    skip = self._warmup_frames
+                    for item in frames:
+                        if self._should_stop(generation):
+                            break
+                        # Let auto-exposure settle after (re)opening the source
+                        if skip > 0:
+                            skip -= 1
+                            continue
+                        self._publish(item)
+                        backoff = self._backoff_min
+                except Exception as e:
+                    print(f"Frame hub error for {self.source}: {e}")
+                    with self._cond:
+                        self.error = str(e)
+                        self._cond.notify_all()
+                finally:
+                    close = getattr(frames, "close", None)
+                    if close:
+                        try:
+                            close()
+                        except Exception:
+                            pass
+                if self._should_stop(generation):
+                    break
+                with self._cond:
+                    self.reconnects += 1
+                print(f"Frame hub reconnecting to {self.source} in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self._backoff_max)
+        finally:
+            with self._cond:
+                if generation == self._generation:
+                    self._running = False
+                self._cond.notify_all()
+                listeners = list(self._listeners)
+            for callback in listeners:
+                callback()
+
+    def wait_for_frame(self, timeout=10.0):
+        """Start the producer and block until the first frame or an error. Returns True if a frame is available."""
+        with self._cond:
+            self._ensure_running()
+            self._cond.wait_for(
+                lambda: self._frame is not None or self.error is not None or not self._running, timeout)
+            return self._frame is not None
+
+    def pin(self):
+        """Keep the source open (and the producer warm) even with no stream viewers."""
+        with self._cond:
+            self._pins += 1
+            self._ensure_running()
+
+    def unpin(self):
+        with self._cond:
+            self._pins = max(0, self._pins - 1)
+            self._last_unsubscribe = time.time()
+
+    def latest(self, max_age=None):
+        """Return ``(jpeg, decoded, captured_at)`` for the newest frame without blocking, or None."""
+        with self._cond:
+            if self._frame is None:
+                return None
+            if max_age is not None and time.time() - self._frame_time > max_age:
+                return None
+            return self._frame, self._decoded, self._frame_time
+
+    def subscribe(self, timeout=10.0, timestamps=False):
+        """Yield the newest JPEG bytes each time a new frame is produced.
+
+        With ``timestamps`` each item is ``(jpeg, captured_at)`` instead.
+        """
+        for _, jpeg, _, captured_at in self._frames(None, timeout):
+            yield (jpeg, captured_at) if timestamps else jpeg
+
+    def subscribe_frames(self, fps=None, timeout=10.0):
+        """Yield ``(seq, jpeg, decoded)`` for new frames, at most ``fps`` per second when given.
+
+        Pacing is deadline-based: each frame is due ``1/fps`` after the previous
+        deadline rather than after the previous send, so time spent by the
+        consumer doesn't lower the delivered rate; a consumer that falls behind
+        restarts from now instead of bursting to catch up.
+        """
+        for seq, jpeg, decoded, _ in self._frames(fps, timeout):
+            yield seq, jpeg, decoded
+
+    def _frames(self, fps, timeout):
+        self.attach()
+        last_seq = 0
+        interval = 1.0 / fps if fps else 0.0
+        due = time.perf_counter()
+        try:
+            while True:
+                if interval:
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != last_seq or not self._running, timeout)
+                    if self._seq == last_seq:
+                        if not self._running:
+                            return
+                        continue
+                    last_seq = self._seq
+                    jpeg, decoded, captured_at = self._frame, self._decoded, self._frame_time
+                if jpeg is not None:
+                    yield last_seq, jpeg, decoded, captured_at
+                if interval:
+                    due += interval
+                    now = time.perf_counter()
+                    if due < now - interval:
+                        due = now
+        finally:
+            self.detach()
+
+    def attach(self):
+        """Count a viewer (keeping the producer running) without blocking; pair with ``detach``."""
+        with self._cond:
+            self._subscribers += 1
+            self._ensure_running()
+
+    def detach(self):
+        with self._cond:
+            self._subscribers -= 1
+            self._last_unsubscribe = time.time()
+
+    def frame_after(self, last_seq):
+        """``(seq, jpeg, decoded)`` if a frame newer than ``last_seq`` is available, else None. Never blocks."""
+        with self._cond:
+            if self._seq == last_seq or self._frame is None:
+                return None
+            return self._seq, self._frame, self._decoded
+
+    @property
+    def running(self):
+        return self._running
+
+    def status(self):
+        with self._cond:
+            return {
+                "source": str(self.source),
+                "running": self._running,
+                "subscribers": self._subscribers,
+                "pins": self._pins,
+                "framesProduced": self.frames_produced,
+                "reconnects": self.reconnects,
+                "lastFrameAge": (time.time() - self._frame_time) if self._frame_time else None,
+                "error": self.error,
+            }
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def get_frame_hub(source, frame_factory, key=None, **options):
+    """Return the shared hub for ``source`` (or ``key``), creating it on first use."""
+    key = key or str(source)
+    with _hubs_lock:
+        hub = _hubs.get(key)
+        if hub is None:
+            hub = FrameHub(source, frame_factory, **options)
+            _hubs[key] = hub
+        return hub
+
+
+def all_frame_hubs():
+    with _hubs_lock:
+        return list(_hubs.values())
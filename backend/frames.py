@@ -0,0 +1,55 @@
+import os
+import time
+from datetime import datetime
+
+_MIME_BY_EXT = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
+
+class CapturedFrame:
+    """An encoded frame kept in memory from capture through analysis and archival.
+
+    ``data`` holds the encoded image exactly as it will be uploaded; ``decoded``
+    is the OpenCV array when the capture path already had one (HTTP frames are
+    never decoded just to be carried around). ``screen`` holds the local
+    pre-screen measurements once the frame has been screened.
+    """
+
+    __slots__ = ("data", "mime_type", "decoded", "captured_at", "source", "screen")
+
+    def __init__(self, data: bytes, mime_type="image/jpeg", decoded=None, captured_at=None, source=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.decoded = decoded
+        self.captured_at = captured_at or time.time()
+        self.source = source
+        self.screen = None
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        mime_type = _MIME_BY_EXT.get(os.path.splitext(path)[1].lower(), "image/jpeg")
+        return cls(data, mime_type=mime_type, source=path)
+
+    def as_blob(self):
+        """Inline image part accepted by ``GenerativeModel.generate_content``."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def archive(self, directory: str):
+        """Write the encoded bytes to ``directory`` and return the file path."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.captured_at).strftime("%Y%m%d_%H%M%S_%f")
+        ext = {v: k for k, v in _MIME_BY_EXT.items() if k != ".jpeg"}.get(self.mime_type, ".jpg")
+        path = os.path.join(directory, f"capture_{stamp}{ext}")
+        with open(path, "wb") as f:
+            f.write(self.data)
+        return path
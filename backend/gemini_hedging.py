@@ -0,0 +1,287 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from gemini_pool import NoKeyAvailable, is_quota_error
+
+
+class CircuitOpen(Exception):
+    """Inference is paused because recent calls failed too often."""
+
+
+class BudgetExhausted(Exception):
+    """The inference budget refused another request."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """No attempt answered before the request deadline."""
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Opens when the error rate over the last ``window`` calls reaches ``error_threshold``.
+
+    While open every call is refused for ``open_seconds``; afterwards a single
+    trial call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, window=20, error_threshold=0.5, min_calls=5, open_seconds=30.0):
+        self.window = window
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self._results = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= self.open_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_in_flight = False
+                if success:
+                    self.state = "closed"
+                    self._results.clear()
+                else:
+                    self._open()
+                return
+            self._results.append(success)
+            failures = self._results.count(False)
+            if (self.state == "closed" and len(self._results) >= self.min_calls
+                    and failures / len(self._results) >= self.error_threshold):
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.time()
+        self.times_opened += 1
+        print(f"Inference circuit breaker opened; pausing for {self.open_seconds:.0f}s")
+
+    def status(self):
+        with self._lock:
+            recent = len(self._results)
+            return {
+                "state": self.state,
+                "recentCalls": recent,
+                "recentErrorRate": (self._results.count(False) / recent) if recent else 0.0,
+                "timesOpened": self.times_opened,
+                "retryInSeconds": (max(0.0, self.open_seconds - (time.time() - self.opened_at))
+                                   if self.state == "open" else 0.0),
+            }
+
+
+class _RequestKeys:
+    """Keys used by the attempts of one request, shared between their threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = set()
+        # Set once the first attempt holds its key (or gave up), so a hedge never races it to the same key
+        self.settled = threading.Event()
+
+    def used(self):
+        with self._lock:
+            return set(self._keys)
+
+    def add(self, index):
+        with self._lock:
+            self._keys.add(index)
+
+
+class HedgedGemini:
+    """Deadline-bounded Gemini calls on a ``GeminiKeyPool`` with hedging and a circuit breaker.
+
+    The first attempt runs on the best key. If it has not answered within the
+    ``hedge_percentile`` of recent latencies, a duplicate is fired on a
+    different key and whichever answers first wins. A failed attempt is retried
+    on another key while time remains. Nothing waits past ``deadline_seconds``,
+    and the per-request timeout passed to the SDK ends abandoned attempts at the
+    same deadline. ``on_attempt()`` is called before every request, hedges and
+    retries included; when it returns False the request is not sent, no further
+    hedge or retry is launched, and the call fails with ``BudgetExhausted``
+    unless another attempt already in flight answers.
+    """
+
+    def __init__(self, pool, deadline_seconds=12.0, hedging=True, hedge_percentile=0.9,
+                 default_hedge_delay=6.0, min_hedge_delay=1.0, max_attempts=3, breaker=None, workers=8,
+                 on_attempt=None):
+        self.pool = pool
+        self.on_attempt = on_attempt
+        self.deadline_seconds = deadline_seconds
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.deadline_exceeded = 0
+        self.rejected = 0
+        self.budget_refused = 0
+
+    def hedge_delay(self):
+        p = self.latency.percentile(self.hedge_percentile)
+        delay = p if p is not None else self.default_hedge_delay
+        return max(self.min_hedge_delay, min(delay, self.deadline_seconds))
+
+    def _acquire(self, estimated_tokens, keys, deadline):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline passed before the attempt could start")
+        if self.on_attempt and self.on_attempt() is False:
+            raise BudgetExhausted("Inference budget exhausted")
+        # Prefer a key no other attempt of this request has used
+        try:
+            slot = self.pool.acquire(estimated_tokens, timeout=remaining, exclude=keys.used())
+        except NoKeyAvailable:
+            slot = self.pool.acquire(estimated_tokens, timeout=max(0.0, deadline - time.time()))
+        keys.add(slot.index)
+        return slot
+
+    def _attempt(self, parts, estimated_tokens, keys, deadline, first):
+        if first:
+            try:
+                slot = self._acquire(estimated_tokens, keys, deadline)
+            finally:
+                keys.settled.set()
+        else:
+            keys.settled.wait(max(0.0, deadline - time.time()))
+            slot = self._acquire(estimated_tokens, keys, deadline)
+        started = time.time()
+        try:
+            response = self.pool.model_for(slot).generate_content(
+                parts, request_options={"timeout": max(0.1, deadline - time.time())})
+        except Exception as e:
+            self.pool.release(slot, estimated_tokens, error=e)
+            raise
+        usage = getattr(response, "usage_metadata", None)
+        self.pool.release(slot, estimated_tokens, tokens_used=getattr(usage, "total_token_count", None) or None)
+        return response, time.time() - started
+
+    def generate(self, parts, estimated_tokens=1500):
+        """Return the first successful ``generate_content`` response within the deadline."""
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpen("Inference paused by circuit breaker")
+        with self._lock:
+            self.calls += 1
+        deadline = time.time() + self.deadline_seconds
+        keys = _RequestKeys()
+        attempts = 0
+        pending = {}
+        last_error = None
+
+        def launch(kind):
+            nonlocal attempts
+            attempts += 1
+            future = self._executor.submit(self._attempt, parts, estimated_tokens, keys, deadline, kind == "primary")
+            pending[future] = kind
+
+        launch("primary")
+        hedge_at = time.time() + self.hedge_delay()
+        while pending:
+            now = time.time()
+            if now >= deadline:
+                break
+            can_hedge = (self.hedging and attempts < self.max_attempts and len(pending) == 1
+                         and not isinstance(last_error, BudgetExhausted))
+            timeout = (min(hedge_at, deadline) if can_hedge else deadline) - now
+            done, _ = wait(list(pending), timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            if not done:
+                if can_hedge and time.time() >= hedge_at:
+                    with self._lock:
+                        self.hedges += 1
+                    launch("hedge")
+                continue
+            for future in done:
+                kind = pending.pop(future)
+                try:
+                    response, seconds = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self.latency.record(seconds)
+                self.breaker.record(True)
+                if kind == "hedge":
+                    with self._lock:
+                        self.hedge_wins += 1
+                return response
+            # Every finished attempt failed: retry on another key while time, attempts and budget remain
+            if (not pending and attempts < self.max_attempts and time.time() < deadline
+                    and not isinstance(last_error, BudgetExhausted)):
+                with self._lock:
+                    self.retries += 1
+                if is_quota_error(last_error):
+                    print("Gemini attempt rate limited; retrying on another key")
+                launch("retry")
+                hedge_at = time.time() + self.hedge_delay()
+
+        if not pending and isinstance(last_error, BudgetExhausted):
+            with self._lock:
+                self.budget_refused += 1
+            raise last_error  # not a Gemini failure, so the breaker is left alone
+        self.breaker.record(False)
+        if pending or last_error is None or isinstance(last_error, DeadlineExceeded):
+            with self._lock:
+                self.deadline_exceeded += 1
+            raise DeadlineExceeded(f"Gemini did not answer within {self.deadline_seconds:g}s")
+        raise last_error
+
+    def status(self):
+        with self._lock:
+            stats = {
+                "deadlineSeconds": self.deadline_seconds,
+                "hedging": self.hedging,
+                "hedgeDelaySeconds": self.hedge_delay(),
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedgeWins": self.hedge_wins,
+                "retries": self.retries,
+                "deadlineExceeded": self.deadline_exceeded,
+                "rejectedByBreaker": self.rejected,
+                "refusedByBudget": self.budget_refused,
+            }
+        stats["latencyP50"] = self.latency.percentile(0.5)
+        stats["latencyP90"] = self.latency.percentile(0.9)
+        stats["latencyP99"] = self.latency.percentile(0.99)
+        stats["breaker"] = self.breaker.status()
+        return stats
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
+
+
+class NoKeyAvailable(Exception):
+    """Every key is cooling down or out of budget for longer than the caller can wait."""
+
+
+def is_quota_error(error):
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+
+class TokenBucket:
+    """Continuous-refill token bucket holding at most one minute of budget."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` is available (requests larger than capacity only need a full bucket)."""
+        self._refill(now)
+        need = min(amount, self.capacity) - self.tokens
+        return 0.0 if need <= 0 else need / self.rate
+
+    def take(self, amount, now):
+        # May go negative when the actual usage reported later exceeds the estimate
+        self._refill(now)
+        self.tokens -= amount
+
+
+def _bind_client(model, client):
+    """Point a GenerativeModel at ``client``.
+
+    The SDK has no public way to give a model its own client, so this sets the
+    private ``_client`` attribute; it fails loudly if an SDK upgrade renames it.
+    """
+    if not hasattr(model, "_client"):
+        raise RuntimeError("google.generativeai.GenerativeModel has no _client attribute; "
+                           "per-key clients need updating for this SDK version")
+    model._client = client
+    return model
+
+
+class KeySlot:
+    """One API key: its budgets, cooldown, counters and cached client."""
+
+    __slots__ = ("index", "key", "requests", "tokens", "cooldown_until", "consecutive_failures",
+                 "in_flight", "model", "history", "total_requests", "successes", "errors",
+                 "rate_limited", "tokens_used")
+
+    def __init__(self, index, key, rpm, tpm):
+        self.index = index
+        self.key = key
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.model = None
+        self.history = deque()  # (monotonic time, tokens) over the last minute
+        self.total_requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.tokens_used = 0
+
+
+class GeminiKeyPool:
+    """Schedules Gemini requests across API keys by remaining quota.
+
+    Each key has a requests/min and tokens/min token bucket. ``acquire`` hands
+    out the least-used key that has budget right now (waiting if none does);
+    keys that hit 429/quota errors are cooled down with exponential backoff.
+    Each key gets its own cached client, so concurrent workers never touch the
+    process-global ``genai.configure`` state.
+
+    ``endpoint`` points the clients at another Gemini-compatible REST server,
+    e.g. ``http://127.0.0.1:8090`` for ``fake_gemini.py``.
+    """
+
+    def __init__(self, keys, model_name, generation_config=None, rpm=15, tpm=1_000_000,
+                 cooldown_seconds=60.0, max_cooldown_seconds=600.0, endpoint=None):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.rpm = rpm
+        self.tpm = tpm
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.endpoint = endpoint
+        self.slots = [KeySlot(i, k, rpm, tpm) for i, k in enumerate(keys)]
+        self._cond = threading.Condition()
+
+    def _make_client(self, key):
+        if not self.endpoint:
+            return glm.GenerativeServiceClient(client_options={"api_key": key})
+        url = urlparse(self.endpoint if "://" in self.endpoint else f"https://{self.endpoint}")
+        if url.scheme == "http":
+            from google.auth import api_key
+            from google.ai.generativelanguage_v1beta.services.generative_service.transports.rest import (
+                GenerativeServiceRestTransport,
+            )
+            transport = GenerativeServiceRestTransport(
+                host=url.netloc, credentials=api_key.Credentials(key), url_scheme="http")
+            return glm.GenerativeServiceClient(transport=transport)
+        return glm.GenerativeServiceClient(client_options={"api_key": key, "api_endpoint": url.netloc},
+                                           transport="rest")
+
+    def model_for(self, slot):
+        """Cached per-key GenerativeModel (thread-safe to share between workers)."""
+        if slot.model is None:
+            model = genai.GenerativeModel(model_name=self.model_name, generation_config=self.generation_config)
+            # Bind this key's own client instead of the process-global default one
+            slot.model = _bind_client(model, self._make_client(slot.key))
+        return slot.model
+
+    def _wait_for(self, slot, estimated_tokens, now, wall_now):
+        return max(slot.cooldown_until - wall_now,
+                   slot.requests.wait_time(1, now),
+                   slot.tokens.wait_time(estimated_tokens, now))
+
+    def acquire(self, estimated_tokens=1500, timeout=30.0, exclude=()):
+        """Reserve budget on the best available key and return its slot."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wall_now = time.time()
+                best, best_wait, best_score = None, None, None
+                for slot in self.slots:
+                    if slot.index in exclude:
+                        continue
+                    wait = self._wait_for(slot, estimated_tokens, now, wall_now)
+                    # Prefer keys that are ready now, then the one with the most headroom
+                    score = (wait, slot.in_flight, -slot.requests.tokens)
+                    if best_score is None or score < best_score:
+                        best, best_wait, best_score = slot, wait, score
+                if best is None:
+                    raise NoKeyAvailable("No API keys configured")
+                if best_wait <= 0:
+                    best.requests.take(1, now)
+                    best.tokens.take(estimated_tokens, now)
+                    best.in_flight += 1
+                    best.total_requests += 1
+                    return best
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise NoKeyAvailable(f"All API keys busy or cooling down for another {best_wait:.1f}s")
+                self._cond.wait(min(best_wait, remaining))
+
+    def release(self, slot, estimated_tokens=1500, tokens_used=None, error=None):
+        """Return a slot after a call, correcting the token estimate and applying cooldowns."""
+        with self._cond:
+            now = time.monotonic()
+            slot.in_flight -= 1
+            if tokens_used is not None:
+                slot.tokens.take(tokens_used - estimated_tokens, now)
+                slot.tokens_used += tokens_used
+            slot.history.append((now, tokens_used if tokens_used is not None else estimated_tokens))
+            if error is None:
+                slot.successes += 1
+                slot.consecutive_failures = 0
+            else:
+                slot.errors += 1
+                if is_quota_error(error):
+                    slot.rate_limited += 1
+                    slot.consecutive_failures += 1
+                    cooldown = min(self.cooldown_seconds * (2 ** (slot.consecutive_failures - 1)),
+                                   self.max_cooldown_seconds)
+                    slot.cooldown_until = time.time() + cooldown
+                    print(f"API key #{slot.index + 1} rate limited; cooling down for {cooldown:.0f}s")
+            self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            now = time.monotonic()
+            wall_now = time.time()
+            out = []
+            for slot in self.slots:
+                while slot.history and now - slot.history[0][0] > 60:
+                    slot.history.popleft()
+                minute_requests = len(slot.history)
+                minute_tokens = sum(t for _, t in slot.history)
+                out.append({
+                    "index": slot.index + 1,
+                    "key": f"...{slot.key[-4:]}",
+                    "requestsLastMinute": minute_requests,
+                    "tokensLastMinute": minute_tokens,
+                    "requestUtilization": minute_requests / self.rpm if self.rpm else None,
+                    "tokenUtilization": minute_tokens / self.tpm if self.tpm else None,
+                    "inFlight": slot.in_flight,
+                    "coolingDownFor": max(0.0, slot.cooldown_until - wall_now),
+                    "requests": slot.total_requests,
+                    "successes": slot.successes,
+                    "errors": slot.errors,
+                    "rateLimited": slot.rate_limited,
+                    "tokensUsed": slot.tokens_used,
+                })
+            return out
@@ -0,0 +1,309 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+DETECTIONS = "detections"
+TICKS = "ticks"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS species (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS detections (
+    ts REAL NOT NULL, species_id INTEGER NOT NULL, count REAL, confidence REAL, alert_level TEXT,
+    particles INTEGER
+);
+CREATE INDEX IF NOT EXISTS detections_species_ts ON detections (species_id, ts);
+CREATE INDEX IF NOT EXISTS detections_ts ON detections (ts);
+CREATE TABLE IF NOT EXISTS ticks (
+    ts REAL NOT NULL, session TEXT NOT NULL, species_id INTEGER NOT NULL, data_timestamp TEXT, raw REAL,
+    moving_avg REAL, threshold REAL, breach INTEGER, alert INTEGER
+);
+CREATE INDEX IF NOT EXISTS ticks_species_ts ON ticks (species_id, ts);
+CREATE INDEX IF NOT EXISTS ticks_ts ON ticks (ts);
+"""
+
+_COLUMNS = {
+    DETECTIONS: ("count", "confidence", "alert_level", "particles"),
+    TICKS: ("session", "data_timestamp", "raw", "moving_avg", "threshold", "breach", "alert"),
+}
+
+
+def to_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def parse_time(value, default=None):
+    """Epoch seconds from a number, a numeric string or an ISO 8601 timestamp (naive means UTC)."""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class HistoryStore:
+    """Embedded time-series store for detections and emulation ticks (SQLite in WAL mode).
+
+    Producers only enqueue (``record_detections``/``record_ticks`` never touch
+    the disk); a single writer thread commits queued rows in batched
+    transactions. Species names are dictionary-encoded and both tables are
+    indexed on ``(species_id, ts)`` and ``ts``, so time-range queries with or
+    without a species filter are index range scans. Rows older than the
+    retention period are deleted in chunks and the freed pages returned to the
+    file system by the same thread.
+    """
+
+    def __init__(self, path, retention_days=30.0, tick_retention_days=7.0, max_queue=10000,
+                 batch_rows=5000, flush_interval=1.0, maintenance_interval=600.0):
+        self.path = path
+        self.retention = {DETECTIONS: retention_days * 86400, TICKS: tick_retention_days * 86400}
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.maintenance_interval = maintenance_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._species = {}
+        self._species_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = {DETECTIONS: 0, TICKS: 0}
+        self.dropped = 0
+        self.deleted = 0
+        self.last_maintenance = None
+        self.last_error = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Only takes effect on a fresh file (or after VACUUM); lets retention shrink the file
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        self._load_species(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _reader(self):
+        """Per-thread read connection; WAL readers never block the writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+        return conn
+
+    def _load_species(self, conn):
+        with self._species_lock:
+            self._species = {name: sid for sid, name in conn.execute("SELECT id, name FROM species")}
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+
+    def _enqueue(self, kind, rows):
+        if not rows:
+            return
+        self.start()
+        try:
+            self._queue.put_nowait((kind, rows))
+        except queue.Full:
+            self.dropped += len(rows)
+
+    def record_detections(self, species_list, ts=None):
+        """Queue one analysis result (a list of species dicts) captured at ``ts``."""
+        ts = time.time() if ts is None else ts
+        rows = []
+        for sp in species_list or []:
+            if not isinstance(sp, dict):
+                continue
+            name = sp.get("phytoplanktonscientificName") or "Unknown"
+            rows.append((ts, name, to_number(sp.get("no of that pyhtoplankon") or sp.get("count")),
+                         to_number(sp.get("Confidence")), sp.get("alertLevel"), sp.get("localParticleCount")))
+        self._enqueue(DETECTIONS, rows)
+
+    def record_ticks(self, session_id, timestamp, ticks, ts=None):
+        """Queue the ``emulation_tick`` payloads of one emulation batch.
+
+        Rows are indexed by when they were emitted (``ts``, default now), so
+        replayed historical datasets aren't aged out by retention on arrival;
+        the dataset's own ``timestamp`` is kept alongside.
+        """
+        ts = time.time() if ts is None else ts
+        rows = [(ts, t.get("species") or "Unknown", session_id, timestamp, t.get("raw"), t.get("movingAvg"),
+                 t.get("threshold"), int(bool(t.get("breach"))), int(bool(t.get("alertTriggered"))))
+                for t in ticks]
+        self._enqueue(TICKS, rows)
+
+    def _species_id(self, conn, name):
+        sid = self._species.get(name)
+        if sid is None:
+            conn.execute("INSERT OR IGNORE INTO species (name) VALUES (?)", (name,))
+            sid = conn.execute("SELECT id FROM species WHERE name = ?", (name,)).fetchone()[0]
+            with self._species_lock:
+                self._species[name] = sid
+        return sid
+
+    def _write(self, conn, batch):
+        grouped = {DETECTIONS: [], TICKS: []}
+        for kind, rows in batch:
+            grouped[kind].extend(rows)
+        with conn:
+            for kind, rows in grouped.items():
+                if not rows:
+                    continue
+                encoded = [(r[0], self._species_id(conn, r[1])) + tuple(r[2:]) for r in rows]
+                columns = ("ts", "species_id") + _COLUMNS[kind]
+                conn.executemany(
+                    f"INSERT INTO {kind} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    encoded)
+                self.written[kind] += len(rows)
+
+    def _maintain(self, conn, chunk=50000):
+        now = time.time()
+        for kind, seconds in self.retention.items():
+            if seconds <= 0:
+                continue
+            while True:
+                with conn:
+                    cur = conn.execute(
+                        f"DELETE FROM {kind} WHERE rowid IN "
+                        f"(SELECT rowid FROM {kind} WHERE ts < ? ORDER BY ts LIMIT ?)",
+                        (now - seconds, chunk))
+                self.deleted += cur.rowcount
+                if cur.rowcount < chunk:
+                    break
+        conn.executescript("PRAGMA incremental_vacuum;")  # run to completion; execute() frees one page
+        conn.execute("PRAGMA optimize")  # keeps planner statistics current as the tables grow
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.last_maintenance = now
+
+    def _run(self):
+        conn = self._connect()
+        next_maintenance = time.time()
+        while True:
+            batch, rows = [], 0
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                batch.append(item)
+                rows += len(item[1])
+                while rows < self.batch_rows:
+                    item = self._queue.get_nowait()
+                    batch.append(item)
+                    rows += len(item[1])
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self._write(conn, batch)
+                if time.time() >= next_maintenance:
+                    self._maintain(conn)
+                    next_maintenance = time.time() + self.maintenance_interval
+            except sqlite3.Error as e:
+                self.last_error = str(e)
+                print(f"History store write failed: {e}")
+                self._load_species(conn)  # forget species ids from a rolled-back transaction
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout=10.0):
+        """Wait until everything queued so far has been written (for tools and shutdown)."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def query(self, kind=DETECTIONS, start=None, end=None, species=None, session=None, limit=1000):
+        """Rows of ``kind`` with ``start <= ts < end``, optionally for some species/session, oldest first."""
+        if kind not in _COLUMNS:
+            raise ValueError(f"Unknown history kind: {kind}")
+        end = time.time() if end is None else end
+        start = end - 86400 if start is None else start
+        conn = self._reader()
+        where = ["t.ts >= ?", "t.ts < ?"]
+        params = [start, end]
+        if species:
+            with self._species_lock:
+                ids = [self._species[name] for name in species if name in self._species]
+            if not ids:
+                return []
+            where.append(f"t.species_id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        if session is not None and kind == TICKS:
+            where.append("t.session = ?")
+            params.append(session)
+        columns = _COLUMNS[kind]
+        sql = (f"SELECT t.ts, s.name, {', '.join('t.' + c for c in columns)} FROM {kind} t "
+               f"JOIN species s ON s.id = t.species_id WHERE {' AND '.join(where)} ORDER BY t.ts LIMIT ?")
+        params.append(limit)
+        out = []
+        for row in conn.execute(sql, params):
+            item = {"ts": row[0], "timestamp": _iso(row[0]), "species": row[1]}
+            item.update(zip(columns, row[2:]))
+            out.append(item)
+        return out
+
+    def series(self, kind, column, species, start, end, session=None):
+        """``(ts, values)`` arrays of one column for one species, oldest first (for downsampling)."""
+        if column not in _COLUMNS[kind]:
+            raise ValueError(f"Unknown {kind} column: {column}")
+        with self._species_lock:
+            sid = self._species.get(species)
+        if sid is None:
+            return np.zeros(0), np.zeros(0)
+        sql = f"SELECT ts, {column} FROM {kind} WHERE species_id = ? AND ts >= ? AND ts < ?"
+        params = [sid, start, end]
+        if session is not None and kind == TICKS:
+            sql += " AND session = ?"
+            params.append(session)
+        rows = self._reader().execute(sql + " ORDER BY ts", params).fetchall()
+        if not rows:
+            return np.zeros(0), np.zeros(0)
+        arr = np.array(rows, dtype=np.float64)
+        return arr[:, 0], arr[:, 1]
+
+    def status(self):
+        try:
+            size = os.path.getsize(self.path) + (os.path.getsize(f"{self.path}-wal")
+                                                 if os.path.exists(f"{self.path}-wal") else 0)
+        except OSError:
+            size = None
+        return {
+            "path": self.path,
+            "bytes": size,
+            "queued": self._queue.qsize(),
+            "written": dict(self.written),
+            "dropped": self.dropped,
+            "deletedByRetention": self.deleted,
+            "retentionDays": {k: v / 86400 for k, v in self.retention.items()},
+            "species": len(self._species),
+            "lastMaintenance": self.last_maintenance,
+            "lastError": self.last_error,
+        }
@@ -0,0 +1,139 @@
+JPEG_SOI = b"\xff\xd8"
+
+_SEEK_DELIM = 0
+_HEADERS = 1
+_BODY = 2
+
+
+def boundary_from_content_type(content_type: str, default: str = "frame"):
+    """Extract the multipart boundary from a Content-Type header value."""
+    if "multipart" in content_type and "boundary=" in content_type:
+        boundary = content_type.split("boundary=")[-1].split(";")[0].strip().strip('"')
+        if boundary.startswith("--"):
+            # Some cameras put the dashes into the declared boundary already
+            boundary = boundary[2:]
+        return boundary or default
+    return default
+
+
+def _content_length(header_block):
+    """Return the Content-Length value from a raw header block, or None."""
+    lowered = bytes(header_block).lower()
+    idx = lowered.find(b"content-length:")
+    if idx == -1:
+        return None
+    end = lowered.find(b"\r\n", idx)
+    value = lowered[idx + 15:end if end != -1 else len(lowered)].strip()
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class MultipartMJPEGParser:
+    """Incremental multipart/x-mixed-replace parser with linear cost per byte.
+
+    Data is appended to a single reusable bytearray; scanning resumes where the
+    previous ``feed`` stopped, and consumed bytes are dropped in one move at the
+    start of the next ``feed``. When a part declares ``Content-Length`` the body
+    is sliced directly without searching it for the boundary.
+
+    ``feed`` returns the JPEG bodies of completed parts. In passthrough mode it
+    returns each upstream part (headers and body untouched) framed with
+    ``out_boundary`` instead, ready to be written to a client.
+    """
+
+    def __init__(self, boundary: str, passthrough: bool = False, out_boundary: str = "frame",
+                 max_buffer: int = 32 * 1024 * 1024):
+        self._delim = b"--" + boundary.encode()
+        self._passthrough = passthrough
+        self._out_prefix = b"--" + out_boundary.encode() + b"\r\n"
+        self._max_buffer = max_buffer
+        self._buf = bytearray()
+        self._start = 0
+        self._scan = 0
+        self._state = _SEEK_DELIM
+        self._headers_start = 0
+        self._body_start = 0
+        self._content_length = None
+        self.parts_parsed = 0
+        self.bytes_dropped = 0
+
+    def _compact(self):
+        start = self._start
+        if not start:
+            return
+        del self._buf[:start]
+        self._start = 0
+        self._scan = max(0, self._scan - start)
+        self._headers_start = max(0, self._headers_start - start)
+        self._body_start = max(0, self._body_start - start)
+
+    def _emit(self, out, body_end):
+        buf = self._buf
+        body_start = self._body_start
+        if body_end - body_start < 2 or buf[body_start:body_start + 2] != JPEG_SOI:
+            return
+        with memoryview(buf) as mv:
+            if self._passthrough:
+                out.append(b"".join((self._out_prefix, mv[self._headers_start:body_end], b"\r\n")))
+            else:
+                out.append(bytes(mv[body_start:body_end]))
+        self.parts_parsed += 1
+
+    def feed(self, chunk):
+        self._compact()
+        buf = self._buf
+        buf += chunk
+        if len(buf) > self._max_buffer:
+            # Upstream is not sending boundaries we understand; resync
+            self.bytes_dropped += len(buf)
+            buf.clear()
+            self._start = self._scan = 0
+            self._state = _SEEK_DELIM
+            return []
+
+        out = []
+        delim = self._delim
+        while True:
+            if self._state == _SEEK_DELIM:
+                idx = buf.find(delim, max(self._start, self._scan))
+                if idx == -1:
+                    self._scan = max(self._start, len(buf) - len(delim) + 1)
+                    return out
+                self._start = idx + len(delim)
+                self._scan = self._start
+                self._state = _HEADERS
+            elif self._state == _HEADERS:
+                idx = buf.find(b"\r\n\r\n", max(self._start, self._scan - 3))
+                if idx == -1:
+                    self._scan = len(buf)
+                    return out
+                # Headers begin after the CRLF that follows the delimiter
+                self._headers_start = idx + 2 if idx == self._start else self._start + 2
+                with memoryview(buf) as mv:
+                    self._content_length = _content_length(mv[self._headers_start:idx])
+                self._body_start = idx + 4
+                # Keep the header block in the buffer until the part is emitted
+                self._start = self._headers_start
+                self._scan = self._body_start
+                self._state = _BODY
+            else:
+                if self._content_length is not None:
+                    body_end = self._body_start + self._content_length
+                    if len(buf) < body_end:
+                        return out
+                    self._emit(out, body_end)
+                    self._start = body_end
+                else:
+                    idx = buf.find(delim, max(self._body_start, self._scan))
+                    if idx == -1:
+                        self._scan = max(self._body_start, len(buf) - len(delim) + 1)
+                        return out
+                    body_end = idx
+                    if buf[body_end - 2:body_end] == b"\r\n":
+                        body_end -= 2
+                    self._emit(out, body_end)
+                    self._start = idx
+                self._scan = self._start
+                self._state = _SEEK_DELIM
@@ -0,0 +1,181 @@
+import queue
+import threading
+import time
+from collections import deque
+
+DROP_OLDEST = "drop_oldest"  # make room by discarding the stalest queued item
+DROP_NEWEST = "drop_newest"  # reject the incoming item when full
+BLOCK = "block"              # backpressure: the producer waits for room
+
+_STOP = object()
+
+
+class Stage:
+    """A pipeline stage: a bounded queue drained by a small pool of worker threads.
+
+    ``handler(item)`` processes one item; a non-None return value is submitted to
+    ``downstream``. What happens when the queue is full is decided by ``policy``.
+
+    With ``batch_size > 1`` a worker takes up to that many queued items at once
+    (waiting at most ``batch_wait`` seconds for more after the first) and calls
+    ``handler(items)``, which returns one result per item.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=8, policy=DROP_OLDEST, downstream=None,
+                 throughput_window=60.0, batch_size=1, batch_wait=0.0):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.policy = policy
+        self.downstream = downstream
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._completed_at = deque()  # (finish time, items) per handler call, within the throughput window
+        self._completed_recent = 0
+        self._throughput_window = throughput_window
+        self.running = False
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy = 0
+        self.total_seconds = 0.0
+        self.batches = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        """Stop the workers; items still queued are discarded."""
+        if not self.running:
+            return
+        self.running = False
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        self._threads = []
+
+    def submit(self, item, timeout=None):
+        """Queue an item according to the stage policy. Returns False if it was dropped."""
+        with self._lock:
+            self.submitted += 1
+        if self.policy == BLOCK:
+            try:
+                self.queue.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                self._count_drop()
+                return False
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                if self.policy == DROP_NEWEST:
+                    self._count_drop()
+                    return False
+                try:
+                    self.queue.get_nowait()
+                    self._count_drop()
+                except queue.Empty:
+                    pass
+
+    def _count_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _take_batch(self, first):
+        """Collect ``first`` plus whatever else is queued, up to ``batch_size`` items."""
+        items = [first]
+        deadline = time.time() + self.batch_wait
+        while len(items) < self.batch_size:
+            try:
+                remaining = deadline - time.time()
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Hand the stop marker back to whichever worker reads next
+                self.queue.put(_STOP)
+                break
+            items.append(item)
+        return items
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            items = self._take_batch(item) if self.batch_size > 1 else None
+            started = time.time()
+            with self._lock:
+                self.busy += 1
+            results = []
+            try:
+                if items is None:
+                    results = [self.handler(item)]
+                else:
+                    results = list(self.handler(items))
+            except Exception as e:
+                print(f"Pipeline stage {self.name} failed: {e}")
+                with self._lock:
+                    self.errors += 1
+            finished = time.time()
+            count = 1 if items is None else len(items)
+            with self._lock:
+                self.busy -= 1
+                self.processed += count
+                self.total_seconds += finished - started
+                self._completed_at.append((finished, count))
+                self._completed_recent += count
+                self._trim_completed_locked(finished)
+                if items is not None:
+                    self.batches += 1
+            if self.downstream is not None and self.running:
+                for result in results:
+                    if result is not None:
+                        self.downstream.submit(result)
+
+    def _trim_completed_locked(self, now):
+        while self._completed_at and now - self._completed_at[0][0] > self._throughput_window:
+            self._completed_recent -= self._completed_at.popleft()[1]
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            self._trim_completed_locked(now)
+            recent = self._completed_recent
+            return {
+                "name": self.name,
+                "running": self.running,
+                "policy": self.policy,
+                "workers": self.workers,
+                "busy": self.busy,
+                "queueDepth": self.queue.qsize(),
+                "queueCapacity": self.queue.maxsize,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "throughputPerSec": recent / self._throughput_window,
+                "avgSeconds": (self.total_seconds / self.processed) if self.processed else None,
+                "batchSize": self.batch_size,
+                "batches": self.batches,
+            }
@@ -0,0 +1,161 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frames import CapturedFrame
+from prescreen import analysis_gray, find_field_of_view
+
+JPEG = "jpeg"
+WEBP = "webp"
+
+_ENCODINGS = {
+    JPEG: (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    WEBP: (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+_REDUCED_COLOR = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# Start-of-frame markers (baseline, progressive, lossless...); DHT, JPG and DAC share the range
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data):
+    """``(width, height)`` from a JPEG's start-of-frame header without decoding it, or None."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _SOF_MARKERS:
+            return int.from_bytes(data[i + 7:i + 9], "big"), int.from_bytes(data[i + 5:i + 7], "big")
+        if marker == 0xD8 or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+class FramePreprocessor:
+    """Shrinks frames before upload: crop to the circular field of view, resize, re-encode.
+
+    The crop is the square bounding box of the field of view (reusing the
+    circle found by the pre-screen when there is one). The result is resized so
+    its long edge is at most ``max_edge`` and encoded as JPEG or WebP at
+    ``quality``. JPEGs are decoded at the smallest reduced scale that still
+    covers ``max_edge``. If the output isn't smaller the original is kept.
+    """
+
+    def __init__(self, max_edge=1024, fmt=JPEG, quality=85, crop=True, margin=0.02):
+        if fmt not in _ENCODINGS:
+            raise ValueError(f"Unknown image format: {fmt}")
+        self.max_edge = max_edge
+        self.format = fmt
+        self.quality = quality
+        self.crop = crop
+        self.margin = margin
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cropped = 0
+        self.kept_original = 0
+        self.total_seconds = 0.0
+        self.last = None
+
+    def _field_of_view(self, frame):
+        """Field of view circle in full-frame pixels, or None."""
+        if frame.screen is not None:
+            return frame.screen.fov
+        gray, scale = analysis_gray(frame)
+        if gray is None:
+            return None
+        fov = find_field_of_view(gray)
+        return None if fov is None else [v * scale for v in fov]
+
+    def _decode(self, frame, crop_edge):
+        if frame.decoded is not None:
+            return frame.decoded, 1
+        buf = np.frombuffer(frame.data, dtype=np.uint8)
+        size = jpeg_size(frame.data)
+        if size is not None:
+            # The kept region is the crop, or the whole frame when there is no field of view
+            edge = min(crop_edge, max(size))
+            for factor, flag in _REDUCED_COLOR:
+                if edge / factor >= self.max_edge:
+                    return cv2.imdecode(buf, flag), factor
+        return cv2.imdecode(buf, cv2.IMREAD_COLOR), 1
+
+    def process(self, frame: CapturedFrame):
+        """Return an upload-ready CapturedFrame (possibly ``frame`` itself) and record the bytes saved."""
+        started = time.perf_counter()
+        fov = self._field_of_view(frame) if self.crop else None
+        crop_edge = 2 * fov[2] * (1 + self.margin) if fov else float("inf")
+
+        image, factor = self._decode(frame, crop_edge)
+        if image is None:
+            return frame
+        h, w = image.shape[:2]
+        if fov:
+            cx, cy, r = (v / factor for v in fov)
+            r *= 1 + self.margin
+            x0, y0 = max(0, int(cx - r)), max(0, int(cy - r))
+            x1, y1 = min(w, int(np.ceil(cx + r))), min(h, int(np.ceil(cy + r)))
+            if x1 - x0 > 1 and y1 - y0 > 1:
+                image = image[y0:y1, x0:x1]
+        edge = max(image.shape[:2])
+        if edge > self.max_edge:
+            f = self.max_edge / edge
+            image = cv2.resize(image, (max(1, round(image.shape[1] * f)), max(1, round(image.shape[0] * f))),
+                               interpolation=cv2.INTER_AREA)
+
+        ext, mime_type, quality_flag = _ENCODINGS[self.format]
+        ok, buf = cv2.imencode(ext, image, [quality_flag, int(self.quality)])
+        out = frame
+        if ok and buf.size < frame.size:
+            out = CapturedFrame(buf.tobytes(), mime_type=mime_type, decoded=image,
+                                captured_at=frame.captured_at, source=frame.source)
+            out.screen = frame.screen
+        seconds = time.perf_counter() - started
+
+        saved = frame.size - out.size
+        with self._lock:
+            self.frames += 1
+            self.bytes_in += frame.size
+            self.bytes_out += out.size
+            self.total_seconds += seconds
+            if fov and out is not frame:
+                self.cropped += 1
+            if out is frame:
+                self.kept_original += 1
+            self.last = {
+                "bytesIn": frame.size,
+                "bytesOut": out.size,
+                "bytesSaved": saved,
+                "width": image.shape[1] if out is not frame else None,
+                "height": image.shape[0] if out is not frame else None,
+                "ms": seconds * 1000,
+            }
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {
+                "maxEdge": self.max_edge,
+                "format": self.format,
+                "quality": self.quality,
+                "crop": self.crop,
+                "frames": self.frames,
+                "cropped": self.cropped,
+                "keptOriginal": self.kept_original,
+                "bytesIn": self.bytes_in,
+                "bytesOut": self.bytes_out,
+                "bytesSaved": self.bytes_in - self.bytes_out,
+                "avgBytesSaved": ((self.bytes_in - self.bytes_out) / self.frames) if self.frames else None,
+                "avgMs": (self.total_seconds / self.frames * 1000) if self.frames else None,
+                "last": self.last,
+            }
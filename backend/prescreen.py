@@ -0,0 +1,194 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Analysis runs on a downscaled grayscale copy; the gates are calibrated at this size
+ANALYSIS_EDGE = 320
+
+
+def analysis_gray(frame):
+    """Grayscale copy of a CapturedFrame with its long edge at most ``ANALYSIS_EDGE`` pixels.
+
+    JPEGs without a decoded array are decoded at reduced scale, which costs a
+    fraction of a full decode. Returns ``(gray, scale)`` where ``scale`` maps
+    analysis coordinates back to the full frame.
+    """
+    if frame.decoded is not None:
+        gray = frame.decoded
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+        full_edge = max(gray.shape[:2])
+    else:
+        buf = np.frombuffer(frame.data, dtype=np.uint8)
+        gray = cv2.imdecode(buf, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if gray is None:
+            return None, 1.0
+        full_edge = max(gray.shape[:2]) * 4
+    edge = max(gray.shape[:2])
+    if edge > ANALYSIS_EDGE:
+        f = ANALYSIS_EDGE / edge
+        gray = cv2.resize(gray, (max(1, int(gray.shape[1] * f)), max(1, int(gray.shape[0] * f))),
+                          interpolation=cv2.INTER_AREA)
+    return gray, full_edge / max(gray.shape[:2])
+
+
+def find_field_of_view(gray, min_radius_fraction=0.2, min_fill=0.6):
+    """Locate the circular, illuminated field of view of a microscope frame.
+
+    Otsu-thresholds the frame, takes the largest bright blob and fits its
+    enclosing circle. Returns ``(cx, cy, r)`` in ``gray`` coordinates, or None
+    when no convincing circle is found (e.g. the sample fills the whole frame).
+    """
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    blob = max(contours, key=cv2.contourArea)
+    (cx, cy), r = cv2.minEnclosingCircle(blob)
+    if r < min_radius_fraction * min(gray.shape[:2]):
+        return None
+    # A circle that covers the frame's corners is just the frame itself
+    h, w = gray.shape[:2]
+    if r * r >= (max(cx, w - cx) ** 2 + max(cy, h - cy) ** 2):
+        return None
+    if cv2.contourArea(blob) / (np.pi * r * r) < min_fill:
+        return None
+    return float(cx), float(cy), float(r)
+
+
+class ScreenResult:
+    """Outcome of the local pre-screen for one frame."""
+
+    __slots__ = ("passed", "reason", "particles", "sharpness", "brightness", "clipped", "fov", "seconds")
+
+    def __init__(self, passed, reason, particles, sharpness, brightness, clipped, fov, seconds):
+        self.passed = passed
+        self.reason = reason
+        self.particles = particles
+        self.sharpness = sharpness
+        self.brightness = brightness
+        self.clipped = clipped
+        self.fov = fov
+        self.seconds = seconds
+
+    def as_dict(self):
+        return {
+            "passed": self.passed,
+            "reason": self.reason,
+            "particles": self.particles,
+            "sharpness": self.sharpness,
+            "brightness": self.brightness,
+            "clipped": self.clipped,
+            "fieldOfView": self.fov,
+            "ms": self.seconds * 1000,
+        }
+
+
+class PreScreener:
+    """Cheap local gate in front of Gemini: skips empty, blurred or badly exposed frames.
+
+    Inside the circular field of view it measures sharpness (variance of the
+    Laplacian), exposure (mean brightness and the clipped-pixel fraction) and
+    counts particles as blobs that differ from the smoothed background by at
+    least ``particle_contrast`` grey levels. A frame passes when every gate
+    holds. Everything runs on a ~320 px grayscale copy in a few milliseconds.
+    """
+
+    def __init__(self, min_particles=1, min_sharpness=15.0, min_brightness=20.0, max_brightness=240.0,
+                 max_clipped=0.5, particle_contrast=25, min_particle_area=2, max_particle_fraction=0.25):
+        self.min_particles = min_particles
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.particle_contrast = particle_contrast
+        self.min_particle_area = min_particle_area
+        self.max_particle_fraction = max_particle_fraction
+        self._lock = threading.Lock()
+        self.screened = 0
+        self.passed = 0
+        self.rejected = {}
+        self.total_seconds = 0.0
+
+    def _fov_mask(self, gray):
+        fov = find_field_of_view(gray)
+        mask = np.zeros(gray.shape[:2], dtype=np.uint8)
+        if fov is None:
+            mask[:] = 255
+        else:
+            cx, cy, r = fov
+            # Shrink slightly so the bright rim of the aperture doesn't count as detail
+            cv2.circle(mask, (int(round(cx)), int(round(cy))), max(1, int(r * 0.95)), 255, -1)
+        return fov, mask
+
+    def _count_particles(self, gray, mask, inside, brightness):
+        # Estimate the background from inside the field of view only, so the dark
+        # surround doesn't bleed into it and outline the aperture as one huge blob
+        filled = gray.copy()
+        filled[~inside] = int(brightness)
+        background = cv2.blur(filled, (31, 31))
+        diff = cv2.absdiff(gray, background)
+        _, blobs = cv2.threshold(diff, self.particle_contrast, 255, cv2.THRESH_BINARY)
+        blobs = cv2.bitwise_and(blobs, mask)
+        contours, _ = cv2.findContours(blobs, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        max_area = self.max_particle_fraction * cv2.countNonZero(mask)
+        return sum(1 for c in contours if self.min_particle_area <= cv2.contourArea(c) <= max_area)
+
+    def screen(self, frame):
+        """Measure a CapturedFrame and decide whether it is worth sending to Gemini."""
+        started = time.perf_counter()
+        gray, scale = analysis_gray(frame)
+        if gray is None:
+            return self._record(ScreenResult(False, "undecodable", 0, 0.0, 0.0, 0.0, None,
+                                             time.perf_counter() - started))
+        fov, mask = self._fov_mask(gray)
+        inside = mask > 0
+        pixels = gray[inside]
+        brightness = float(pixels.mean()) if pixels.size else 0.0
+        clipped = float(np.count_nonzero((pixels <= 5) | (pixels >= 250)) / pixels.size) if pixels.size else 1.0
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_32F)[inside].var()) if pixels.size else 0.0
+        particles = self._count_particles(gray, mask, inside, brightness)
+
+        if brightness < self.min_brightness:
+            reason = "underexposed"
+        elif brightness > self.max_brightness:
+            reason = "overexposed"
+        elif clipped > self.max_clipped:
+            reason = "clipped"
+        elif sharpness < self.min_sharpness:
+            reason = "blurred"
+        elif particles < self.min_particles:
+            reason = "empty"
+        else:
+            reason = None
+        full_fov = None if fov is None else [round(v * scale, 1) for v in fov]
+        return self._record(ScreenResult(reason is None, reason, particles, sharpness, brightness, clipped,
+                                         full_fov, time.perf_counter() - started))
+
+    def _record(self, result):
+        with self._lock:
+            self.screened += 1
+            self.total_seconds += result.seconds
+            if result.passed:
+                self.passed += 1
+            else:
+                self.rejected[result.reason] = self.rejected.get(result.reason, 0) + 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "screened": self.screened,
+                "passed": self.passed,
+                "rejected": dict(self.rejected),
+                "avgMs": (self.total_seconds / self.screened * 1000) if self.screened else None,
+                "gates": {
+                    "minParticles": self.min_particles,
+                    "minSharpness": self.min_sharpness,
+                    "minBrightness": self.min_brightness,
+                    "maxBrightness": self.max_brightness,
+                    "maxClipped": self.max_clipped,
+                },
+            }
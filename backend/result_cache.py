@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def frame_hash(frame):
+    """64-bit difference hash (dHash) of a CapturedFrame.
+
+    Uses the decoded array when the capture path has one, otherwise decodes the
+    JPEG at 1/8 scale in grayscale, which is far cheaper than a full decode.
+    """
+    if frame.decoded is not None:
+        gray = frame.decoded
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = cv2.imdecode(np.frombuffer(frame.data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if gray is None:
+            return None
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int):
+    return (a ^ b).bit_count()
+
+
+class ResultCache:
+    """Size-bounded LRU of analysis results keyed by perceptual frame hash.
+
+    ``lookup`` returns the result of the closest cached frame within
+    ``max_distance`` bits, ignoring entries older than ``ttl`` seconds. When
+    ``path`` is set the cache is loaded from and saved to a local JSON file so
+    it survives restarts.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0, max_distance=6, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.path = path
+        self._entries = OrderedDict()  # hash -> (stored_at, result)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._load()
+
+    def _expired(self, stored_at, now):
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def lookup(self, h):
+        if h is None:
+            return None
+        now = time.time()
+        with self._lock:
+            best_key, best_dist = None, None
+            for key, (stored_at, _) in list(self._entries.items()):
+                if self._expired(stored_at, now):
+                    del self._entries[key]
+                    continue
+                dist = hamming(key, h)
+                if dist <= self.max_distance and (best_dist is None or dist < best_dist):
+                    best_key, best_dist = key, dist
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1]
+
+    def put(self, h, result):
+        if h is None:
+            return
+        with self._lock:
+            self._entries[h] = (time.time(), result)
+            self._entries.move_to_end(h)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            snapshot = list(self._entries.items()) if self.path else None
+        if snapshot is not None:
+            self._save(snapshot)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                rows = json.load(f)
+            now = time.time()
+            for row in rows[-self.max_entries:]:
+                if not self._expired(row["storedAt"], now):
+                    self._entries[int(row["hash"], 16)] = (row["storedAt"], row["result"])
+            print(f"Loaded {len(self._entries)} cached analysis results from {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Failed loading result cache {self.path}: {e}")
+
+    def _save(self, snapshot):
+        rows = [{"hash": f"{key:016x}", "storedAt": stored_at, "result": result}
+                for key, (stored_at, result) in snapshot]
+        tmp = f"{self.path}.tmp"
+        with self._save_lock:
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(rows, f)
+                os.replace(tmp, self.path)
+            except Exception as e:
+                print(f"Failed saving result cache {self.path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "maxDistance": self.max_distance,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / total) if total else None,
+                "evictions": self.evictions,
+                "persisted": bool(self.path),
+            }
@@ -0,0 +1,140 @@
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+
+@lru_cache(maxsize=65536)
+def parse_count(value):
+    """Parse a count such as ``"1,234"``; unparseable values count as 0.0."""
+    try:
+        return float(str(value).replace(',', '').strip())
+    except ValueError:
+        return 0.0
+
+
+class _SpeciesState:
+    __slots__ = ("window", "total", "fractional", "base_values", "baseline", "above_start", "last_alert")
+
+    def __init__(self, window):
+        self.window = deque(maxlen=window)
+        self.total = 0.0
+        self.fractional = 0  # fractional values currently in the window
+        self.base_values = []
+        self.baseline = None
+        self.above_start = None
+        self.last_alert = 0.0
+
+
+class RollingThresholdEngine:
+    """Per-species moving average, baseline and sustained-breach detection.
+
+    Each species has one ``__slots__`` state object, so a record costs O(1): the
+    moving average keeps a running sum next to its window, the baseline is fixed
+    once its first ``baseline_window`` values are in, and the breach / alert
+    timers are plain attributes.
+
+    ``process_batch`` handles every record of a timestamp in one pass and
+    produces the same ``emulation_tick`` payloads as processing the records one
+    by one. Counts are integers in practice, which keeps the running sum exact;
+    while a window holds a fractional value the sum is recomputed in order so
+    results stay identical to ``sum(window) / len(window)``.
+    """
+
+    def __init__(self, window=5, baseline_window=5, multiplier=1.5, required_seconds=300.0,
+                 cooldown_seconds=300.0, time_scale=1.0, on_alert=None):
+        self.window = window
+        self.baseline_window = baseline_window
+        self.multiplier = multiplier
+        self.required_seconds = required_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.time_scale = time_scale
+        self.on_alert = on_alert
+        self.reset()
+
+    def reset(self):
+        """Forget every species (windows, baselines, breach and alert timers)."""
+        self._states = {}
+
+    def __len__(self):
+        return len(self._states)
+
+    def process(self, rec: dict):
+        """Update state with one record and return its ``emulation_tick`` payload."""
+        return self.process_batch([rec])[0]
+
+    def process_batch(self, records, now=None):
+        """Update state with all records of one timestamp and return their payloads in order."""
+        now = time.time() if now is None else now
+        states = self._states
+        window = self.window
+        baseline_window = self.baseline_window
+        multiplier = self.multiplier
+        required = self.required_seconds
+        cooldown = self.cooldown_seconds
+        out = []
+        for rec in records:
+            species = rec.get('phytoplanktonscientificName') or 'Unknown'
+            raw = parse_count(rec.get('no of that pyhtoplankon') or rec.get('count') or '0')
+            state = states.get(species)
+            if state is None:
+                state = states[species] = _SpeciesState(window)
+
+            # Moving average: running sum, recomputed in order around fractional values
+            win = state.window
+            had_fractional = state.fractional
+            if len(win) == window:
+                old = win[0]
+                state.total -= old
+                if not old.is_integer():
+                    state.fractional -= 1
+            win.append(raw)
+            state.total += raw
+            if not raw.is_integer():
+                state.fractional += 1
+            if had_fractional or state.fractional:
+                state.total = sum(win)
+            moving_avg = state.total / len(win)
+
+            # Baseline: the first baseline_window raw values, fixed once complete
+            baseline = state.baseline
+            if baseline is None:
+                base_values = state.base_values
+                base_values.append(raw)
+                if len(base_values) == baseline_window:
+                    baseline = state.baseline = sum(base_values) / baseline_window
+                    state.base_values = None
+
+            threshold = None
+            breach = False
+            alert = False
+            above_seconds = 0.0
+            if baseline is not None:
+                threshold = baseline * multiplier
+                if moving_avg >= threshold:
+                    breach = True
+                    if state.above_start is None:
+                        state.above_start = now
+                    above_seconds = now - state.above_start
+                    if above_seconds >= required and now - state.last_alert >= cooldown:
+                        above_seconds = (now - state.above_start) * self.time_scale
+                        alert = True
+                        state.last_alert = now
+                else:
+                    state.above_start = None
+
+            out.append({
+                "type": "emulation_tick",
+                "timestamp": rec.get('timestamp') or datetime.utcnow().isoformat(),
+                "species": species,
+                "raw": raw,
+                "movingAvg": moving_avg,
+                "baseline": baseline,
+                "threshold": threshold,
+                "breach": breach,
+                "alertTriggered": alert,
+                "aboveThresholdSeconds": above_seconds,
+            })
+            if alert and self.on_alert:
+                self.on_alert(species)
+        return out
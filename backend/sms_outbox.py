@@ -0,0 +1,234 @@
+import argparse
+import itertools
+import json
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+SMS_SEND_SECONDS = metrics.histogram("sms_send_seconds", "SMS gateway POST latency per recipient", ("outcome",))
+
+
+class SmsOutbox:
+    """Non-blocking SMS dispatch over a pooled keep-alive session.
+
+    ``enqueue`` returns immediately with an alert id. A small worker pool sends
+    one POST per recipient; failed sends are retried with exponential backoff
+    (scheduled on a timer, so a retrying recipient never holds a worker) until
+    ``max_attempts`` is reached. Per-recipient delivery status is kept for the
+    most recent ``history`` alerts.
+    """
+
+    def __init__(self, url, headers, numbers, workers=4, max_attempts=3, backoff_base=1.0,
+                 timeout=5.0, max_queue=1000, history=100):
+        self.url = url
+        self.headers = headers
+        self.numbers = list(numbers)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.history = history
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._alerts = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._threads = []
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._work, name=f"sms-outbox-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def enqueue(self, message, numbers=None):
+        """Queue ``message`` for every recipient and return the alert id (None if no recipient could be queued)."""
+        self.start()
+        numbers = list(numbers) if numbers is not None else self.numbers
+        alert_id = next(self._ids)
+        with self._lock:
+            self._alerts[alert_id] = {
+                "id": alert_id,
+                "message": message,
+                "createdAt": time.time(),
+                "recipients": {n: {"status": "queued", "attempts": 0, "statusCode": None, "error": None}
+                               for n in numbers},
+            }
+            while len(self._alerts) > self.history:
+                self._alerts.popitem(last=False)
+        queued = 0
+        for number in numbers:
+            try:
+                self._queue.put_nowait((alert_id, number, message, 1))
+                queued += 1
+            except queue.Full:
+                self._update(alert_id, number, status="rejected", error="outbox full")
+                with self._lock:
+                    self.rejected += 1
+        return alert_id if queued else None
+
+    def _update(self, alert_id, number, **fields):
+        with self._lock:
+            alert = self._alerts.get(alert_id)
+            if alert is not None:
+                alert["recipients"][number].update(fields)
+
+    def _work(self):
+        while True:
+            # The attempt travels with the item; the alert itself may have left the status history
+            alert_id, number, message, attempt = self._queue.get()
+            status_code, error = None, None
+            started = time.perf_counter()
+            try:
+                r = self.session.post(self.url, headers=self.headers,
+                                      json={"to": number, "message": message}, timeout=self.timeout)
+                status_code = r.status_code
+                if r.status_code != 200:
+                    error = f"HTTP {r.status_code}"
+            except Exception as e:
+                error = str(e)
+            SMS_SEND_SECONDS.labels("sent" if error is None else "failed").observe(time.perf_counter() - started)
+
+            if error is None:
+                self._update(alert_id, number, status="sent", attempts=attempt, statusCode=status_code, error=None)
+                with self._lock:
+                    self.sent += 1
+                print(f"SMS sent to {number}: Success")
+            elif attempt < self.max_attempts:
+                delay = self.backoff_base * (2 ** (attempt - 1))
+                self._update(alert_id, number, status="retrying", attempts=attempt, statusCode=status_code, error=error)
+                with self._lock:
+                    self.retries += 1
+                print(f"SMS to {number} failed ({error}); retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                timer = threading.Timer(delay, self._queue.put,
+                                        args=((alert_id, number, message, attempt + 1),))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._update(alert_id, number, status="failed", attempts=attempt, statusCode=status_code, error=error)
+                with self._lock:
+                    self.failed += 1
+                print(f"SMS failed to {number} after {attempt} attempts: {error}")
+
+    def alert_status(self, alert_id):
+        with self._lock:
+            alert = self._alerts.get(alert_id)
+            return json.loads(json.dumps(alert)) if alert else None
+
+    def status(self, recent=10):
+        with self._lock:
+            alerts = list(self._alerts.values())[-recent:]
+            return {
+                "gateway": self.url,
+                "workers": self.workers,
+                "queueDepth": self._queue.qsize(),
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "recentAlerts": json.loads(json.dumps(alerts)),
+            }
+
+
+def run_fake_gateway(host="127.0.0.1", port=8082, latency=0.05, failure_rate=0.0):
+    """Local stand-in for the SMS gateway: accepts POSTs and answers 200 after ``latency`` seconds."""
+    received = {"count": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real gateway
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            if random.random() < failure_rate:
+                code, payload = 503, b'{"ok": false}'
+            else:
+                code, payload = 200, b'{"ok": true}'
+                with lock:
+                    received["count"] += 1
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.received = received
+    return server
+
+
+def _load_test(args):
+    server = run_fake_gateway(port=args.port, latency=args.latency, failure_rate=args.failure_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    numbers = [f"+9100000{i:05d}" for i in range(args.recipients)]
+    outbox = SmsOutbox(f"http://127.0.0.1:{args.port}", {"Content-Type": "application/json"}, numbers,
+                       workers=args.workers, backoff_base=0.1, history=args.alerts)
+    started = time.time()
+    enqueue_seconds = 0.0
+    for i in range(args.alerts):
+        t0 = time.time()
+        outbox.enqueue(f"load test alert {i}")
+        enqueue_seconds += time.time() - t0
+    expected = args.alerts * args.recipients
+    while outbox.sent + outbox.failed + outbox.rejected < expected:
+        time.sleep(0.01)
+    elapsed = time.time() - started
+    server.shutdown()
+    print(json.dumps({
+        "messages": expected,
+        "sent": outbox.sent,
+        "failed": outbox.failed,
+        "retries": outbox.retries,
+        "seconds": round(elapsed, 3),
+        "messagesPerSec": round(expected / elapsed, 1),
+        "avgEnqueueMs": round(enqueue_seconds / args.alerts * 1000, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SMS outbox stand-in gateway and load test")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gw = sub.add_parser("gateway", help="run a local stand-in SMS gateway")
+    gw.add_argument("--port", type=int, default=8082)
+    gw.add_argument("--latency", type=float, default=0.05)
+    gw.add_argument("--failure-rate", type=float, default=0.0)
+    lt = sub.add_parser("loadtest", help="push alerts through the outbox to a local stand-in gateway")
+    lt.add_argument("--port", type=int, default=18082)
+    lt.add_argument("--alerts", type=int, default=50)
+    lt.add_argument("--recipients", type=int, default=5)
+    lt.add_argument("--workers", type=int, default=4)
+    lt.add_argument("--latency", type=float, default=0.05)
+    lt.add_argument("--failure-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "gateway":
+        server = run_fake_gateway(port=args.port, latency=args.latency, failure_rate=args.failure_rate)
+        print(f"Stand-in SMS gateway listening on http://127.0.0.1:{args.port}")
+        server.serve_forever()
+    else:
+        _load_test(args)
@@ -0,0 +1,145 @@
+import itertools
+import json
+import threading
+from collections import deque
+
+import metrics
+
+SSE_BYTES_SENT = metrics.counter("sse_bytes_sent_total", "Bytes of server-sent events written to clients")
+
+DROP_OLDEST = "drop_oldest"  # a lagging client skips ahead to the newest events it can hold
+DISCONNECT = "disconnect"    # a lagging client is dropped and must reconnect (and resume)
+
+HEARTBEAT = b": keepalive\n\n"
+DISCONNECTED = object()  # returned by ``take`` when a lagging client must reconnect
+
+
+def sse_frame(payload: dict, event_id=None):
+    """Serialize one payload into a complete SSE event."""
+    data = json.dumps(payload)
+    if event_id is None:
+        return f"data: {data}\n\n".encode()
+    return f"id: {event_id}\ndata: {data}\n\n".encode()
+
+
+class SSEBroadcaster:
+    """Fan-out of server-sent events that serializes every event exactly once.
+
+    Published events are stored pre-framed in one shared log of the last
+    ``history`` events. Each client only keeps a cursor into that log, so its
+    buffer is bounded by ``client_buffer`` events: a client that lags further
+    behind either skips the oldest events (``drop_oldest``) or is disconnected
+    (``disconnect``). The log doubles as the replay window for ``Last-Event-ID``
+    resume, and idle clients get a comment heartbeat every ``heartbeat_seconds``.
+    """
+
+    def __init__(self, history=256, client_buffer=64, policy=DROP_OLDEST, heartbeat_seconds=15.0):
+        if policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown SSE policy: {policy}")
+        self.client_buffer = min(client_buffer, history)
+        self.policy = policy
+        self.heartbeat_seconds = heartbeat_seconds
+        self._cond = threading.Condition()
+        self._log = deque(maxlen=history)  # (event_id, frame)
+        self._next_id = 1
+        self.clients = 0
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self.resumed = 0
+        self._listeners = []
+
+    def publish(self, payload: dict):
+        """Serialize ``payload`` once and make it available to every client. Returns the event id."""
+        data = json.dumps(payload)
+        with self._cond:
+            event_id = self._next_id
+            self._next_id += 1
+            self._log.append((event_id, f"id: {event_id}\ndata: {data}\n\n".encode()))
+            self.published += 1
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+        return event_id
+
+    def add_listener(self, callback):
+        """Call ``callback()`` (on the publishing thread) after every publish; used by the asyncio server."""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.remove(callback)
+
+    def attach(self, last_event_id=None):
+        """Register a client and return its starting cursor, resuming after ``last_event_id`` when still in the window."""
+        with self._cond:
+            self.clients += 1
+            cursor = self._next_id
+            if last_event_id is not None and self._log:
+                try:
+                    resume_from = int(last_event_id) + 1
+                except (TypeError, ValueError):
+                    resume_from = None
+                if resume_from is not None and self._log[0][0] <= resume_from <= self._next_id:
+                    cursor = resume_from
+                    self.resumed += 1
+            return cursor
+
+    def detach(self):
+        with self._cond:
+            self.clients -= 1
+
+    def take(self, cursor):
+        """Without blocking, return ``(chunk, cursor)``: the framed events after ``cursor`` joined into
+        one chunk (None if there are none) and the new cursor. A client too far behind under the
+        ``disconnect`` policy gets ``(DISCONNECTED, cursor)``."""
+        with self._cond:
+            if cursor >= self._next_id:
+                return None, cursor
+            oldest = self._log[0][0]
+            floor = max(oldest, self._next_id - self.client_buffer)
+            if cursor < floor:
+                if self.policy == DISCONNECT:
+                    self.disconnected += 1
+                    return DISCONNECTED, cursor
+                self.dropped += floor - cursor
+                cursor = floor
+            pending = [frame for _, frame in itertools.islice(self._log, cursor - oldest, None)]
+            return b"".join(pending), self._next_id
+
+    def stream(self, last_event_id=None, initial=None):
+        """Yield framed SSE bytes for one client, resuming after ``last_event_id`` when still in the window."""
+        cursor = self.attach(last_event_id)
+        try:
+            if initial is not None:
+                chunk = sse_frame(initial)
+                SSE_BYTES_SENT.inc(len(chunk))
+                yield chunk
+            while True:
+                with self._cond:
+                    if cursor >= self._next_id:
+                        self._cond.wait(self.heartbeat_seconds)
+                chunk, cursor = self.take(cursor)
+                if chunk is DISCONNECTED:
+                    return
+                chunk = HEARTBEAT if chunk is None else chunk
+                SSE_BYTES_SENT.inc(len(chunk))
+                yield chunk
+        finally:
+            self.detach()
+
+    def status(self):
+        with self._cond:
+            return {
+                "clients": self.clients,
+                "published": self.published,
+                "lastEventId": self._next_id - 1,
+                "replayWindow": len(self._log),
+                "clientBuffer": self.client_buffer,
+                "policy": self.policy,
+                "dropped": self.dropped,
+                "disconnected": self.disconnected,
+                "resumed": self.resumed,
+            }
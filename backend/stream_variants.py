@@ -0,0 +1,123 @@
+import threading
+
+import cv2
+import numpy as np
+
+_REDUCED_COLOR = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+class FrameVariant:
+    """One re-encoding (JPEG ``quality``, width capped by ``max_width``) of a hub's frames.
+
+    ``encode`` is called by every viewer of the variant with the hub's frame
+    sequence number; only the first caller for a new frame encodes it and the
+    rest get the cached bytes, so the cost is once per source frame however
+    many viewers there are.
+    """
+
+    def __init__(self, cache, quality=None, max_width=None):
+        self.cache = cache
+        self.quality = quality
+        self.max_width = max_width
+        self._lock = threading.Lock()
+        self._seq = None
+        self._jpeg = None
+        self.encoded = 0
+        self.served = 0
+        self.bytes = 0
+
+    def encode(self, seq, jpeg, decoded):
+        with self._lock:
+            self.served += 1
+            if seq == self._seq:
+                return self._jpeg
+            image = self.cache.decoded(seq, jpeg, decoded, self.max_width)
+            if image is None:
+                return jpeg
+            if self.max_width and image.shape[1] > self.max_width:
+                f = self.max_width / image.shape[1]
+                image = cv2.resize(image, (self.max_width, max(1, round(image.shape[0] * f))),
+                                   interpolation=cv2.INTER_AREA)
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)] if self.quality else []
+            ok, buf = cv2.imencode(".jpg", image, params)
+            out = buf.tobytes() if ok else jpeg
+            self._seq, self._jpeg = seq, out
+            self.encoded += 1
+            self.bytes += len(out)
+            return out
+
+    def status(self):
+        with self._lock:
+            return {
+                "quality": self.quality,
+                "maxWidth": self.max_width,
+                "encoded": self.encoded,
+                "served": self.served,
+                "avgBytes": (self.bytes / self.encoded) if self.encoded else None,
+            }
+
+
+class VariantCache:
+    """The variants requested from one hub, plus the hub's latest frame decoded once for all of them.
+
+    HTTP sources carry only JPEG bytes; they are decoded at the smallest
+    reduced scale that still covers the widest variant asking for the frame.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._variants = {}
+        self._decode_lock = threading.Lock()
+        self._decoded_seq = None
+        self._decoded = None
+        self._decoded_factor = 1
+        self._source_width = None
+
+    def get(self, quality=None, max_width=None):
+        key = (quality, max_width)
+        with self._lock:
+            variant = self._variants.get(key)
+            if variant is None:
+                variant = self._variants[key] = FrameVariant(self, quality, max_width)
+            return variant
+
+    def decoded(self, seq, jpeg, decoded, max_width=None):
+        if decoded is not None:
+            return decoded
+        with self._decode_lock:
+            factor = 1
+            if max_width and self._source_width:
+                factor = next((f for f, _ in _REDUCED_COLOR if self._source_width / f >= max_width), 1)
+            # A cached decode serves any variant it is still wide enough for
+            if seq == self._decoded_seq and self._decoded_factor <= factor:
+                return self._decoded
+            buf = np.frombuffer(jpeg, dtype=np.uint8)
+            flag = dict(_REDUCED_COLOR).get(factor, cv2.IMREAD_COLOR)
+            image = cv2.imdecode(buf, flag)
+            if image is None:
+                return None
+            self._source_width = image.shape[1] * factor
+            self._decoded_seq, self._decoded, self._decoded_factor = seq, image, factor
+            return image
+
+    def status(self):
+        with self._lock:
+            return [variant.status() for variant in self._variants.values()]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def variant_cache(key):
+    """Shared ``VariantCache`` for the hub registered under ``key``."""
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = VariantCache()
+        return cache
+
+
+def all_variant_caches():
+    with _caches_lock:
+        return dict(_caches)